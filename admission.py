@@ -0,0 +1,183 @@
+"""Admission control in front of the DB-bound endpoints.
+
+A worker admits at most `limit` requests at a time. Past that, requests
+wait in a queue of at most `max_queue` for up to `timeout` seconds and
+are shed with 503 + Retry-After when the queue is full or the deadline
+passes, instead of piling onto the connection pool. A freed slot goes to
+the best waiting priority first (FIFO within one), so cheap reads keep
+moving while exports wait. Requests that never touch the database are
+not counted at all.
+
+The same controller serves WSGI threads (acquire) and the asyncio loop
+of asgi.py (acquire_async).
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+from config import settings
+
+HIGH, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# No database work behind these
+EXEMPT_PATHS = ("/", "/metrics", "/health/db")
+
+
+def request_priority(method, path):
+    """None (not admission controlled), HIGH, NORMAL or LOW"""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    if path.endswith("/export") or path == "/users/bulk":
+        # Long-running; they hold a connection for the whole dump
+        return LOW
+    if method in ("GET", "HEAD") and path.startswith(("/results", "/stats")):
+        # Served from the result cache or a few primary key lookups
+        return HIGH
+    return NORMAL
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "wake", "granted")
+
+    def __init__(self, priority, seq, wake):
+        self.priority = priority
+        self.seq = seq
+        self.wake = wake
+        self.granted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    def __init__(self, limit, max_queue, timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []
+        self._seq = itertools.count()
+
+    def _enter(self, priority, wake):
+        """Under the lock: True if admitted now, False if shed, else the
+        queued waiter"""
+        if self._active < self.limit and not self._queue:
+            self._active += 1
+            return True
+        if len(self._queue) >= self.max_queue:
+            metrics.admission_rejected_total.inc(PRIORITY_NAMES[priority], "queue_full")
+            return False
+        waiter = _Waiter(priority, next(self._seq), wake)
+        heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _abandon(self, waiter):
+        """The wait ended without a wake-up; True if the slot was handed
+        over meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+        metrics.admission_rejected_total.inc(PRIORITY_NAMES[waiter.priority], "timeout")
+        return False
+
+    def acquire(self, priority=NORMAL):
+        """Block the calling thread until admitted; False means shed"""
+        started = time.perf_counter()
+        event = threading.Event()
+        with self._lock:
+            entered = self._enter(priority, event.set)
+        if isinstance(entered, bool):
+            return entered
+        admitted = event.wait(self.timeout) or self._abandon(entered)
+        metrics.admission_wait_seconds.observe(time.perf_counter() - started)
+        return admitted
+
+    async def acquire_async(self, priority=NORMAL):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+        with self._lock:
+            entered = self._enter(priority, wake)
+        if isinstance(entered, bool):
+            return entered
+        try:
+            await asyncio.wait_for(future, self.timeout)
+            admitted = True
+        except asyncio.TimeoutError:
+            admitted = self._abandon(entered)
+        except BaseException:
+            # Client went away while queued; give back a slot handed to us
+            if self._abandon(entered):
+                self.release()
+            raise
+        metrics.admission_wait_seconds.observe(time.perf_counter() - started)
+        return admitted
+
+    def release(self):
+        with self._lock:
+            if self._queue:
+                # The slot passes straight to the next waiter
+                waiter = heapq.heappop(self._queue)
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                depth[PRIORITY_NAMES[waiter.priority]] += 1
+            return {"limit": self.limit, "active": self._active, "queued": depth}
+
+
+_admission = None
+_configured = False
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    """This worker's controller, or None when admission control is off
+    (ADMISSION_MAX_CONCURRENT = 0)"""
+    if not _configured:
+        with _admission_lock:
+            if not _configured:
+                use_admission(AdmissionController(settings.ADMISSION_MAX_CONCURRENT,
+                                                  settings.ADMISSION_MAX_QUEUE,
+                                                  settings.ADMISSION_QUEUE_TIMEOUT)
+                              if settings.ADMISSION_MAX_CONCURRENT > 0 else None)
+    return _admission
+
+
+def use_admission(controller):
+    """Install this worker's controller, or None for none (asgi.py sizes
+    its own)"""
+    global _admission, _configured
+    _admission, _configured = controller, True
+
+
+def get_admission_stats():
+    return _admission.stats() if _admission is not None else None
+
+
+def _collect_admission_metrics():
+    stats = get_admission_stats()
+    if stats is None:
+        return
+    metrics.admission_active.set(value=stats["active"])
+    for priority, depth in stats["queued"].items():
+        metrics.admission_queue_depth.set(priority, value=depth)
+
+
+metrics.registry.add_collector(_collect_admission_metrics)
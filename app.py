@@ -1,8 +1,20 @@
-from flask import Flask, request, make_response
+import time
+from flask import Flask, request, make_response, jsonify, g, Response
 from flask_cors import CORS
-from routers import user, result
+from routers import user, result, stats
+from database import get_pool_stats, get_replica_stats, begin_request
+from admission import get_admission, get_admission_stats, request_priority
+from routers.common import overloaded_response
+from commands import register_commands
+import metrics
+from config import settings
+from json_provider import FastJSONProvider
+from compression import compress_response
 
 app = Flask(__name__)
+app.json_provider_class = FastJSONProvider
+app.json = FastJSONProvider(app)
+app.json.datetime_format = settings.JSON_DATETIME_FORMAT
 CORS(app,
     resources={
         r"/*":
@@ -19,6 +31,56 @@ CORS(app,
 )
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.http_requests_in_flight.inc()
+    # Reads after a write in this request go to the primary
+    begin_request()
+
+
+@app.before_request
+def admit_request():
+    admission = get_admission()
+    priority = request_priority(request.method, request.path)
+    if admission is None or priority is None:
+        return None
+    if not admission.acquire(priority):
+        return overloaded_response()
+    g.admitted = True
+
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request)
+
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def release_admission(exc):
+    # Streamed exports get here only once the stream is done
+    if g.pop('admitted', False):
+        get_admission().release()
+
+
+@app.teardown_request
+def record_request_metrics(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    metrics.http_requests_in_flight.dec()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = g.pop('response_status', 500)
+    metrics.http_request_duration_seconds.observe(
+        time.perf_counter() - started, route, request.method)
+    metrics.http_requests_total.inc(route, request.method, status)
+
+
 @app.before_request
 def handle_preflight():
     if request.method == "OPTIONS":
@@ -35,12 +97,30 @@ def handle_preflight():
 # Register blueprints with api prefix
 app.register_blueprint(user.bp, url_prefix='/users')
 app.register_blueprint(result.bp, url_prefix='/results')
+app.register_blueprint(stats.bp, url_prefix='/stats')
+
+register_commands(app)
 
 
 @app.route('/')
 def hello():
     return "Hello, application is running!"
 
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/health/db')
+def db_health():
+    return jsonify({
+        "status": "success",
+        "data": {"pool": get_pool_stats(), "replicas": get_replica_stats(),
+                 "admission": get_admission_stats()}
+    })
+
 application = app
 
 if __name__ == "__main__":
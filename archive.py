@@ -0,0 +1,143 @@
+"""Move long soft-deleted rows out of the live tables.
+
+Every batch is a handful of ids handled in its own short transaction, so
+no statement locks more than `batch_size` rows and other writers get in
+between batches. Run it from cron through `flask purge-deleted`.
+"""
+import time
+from datetime import datetime, timedelta
+
+from models.stats import StatsModel
+
+USER_COLUMNS = ("id, name, no_hp, prodi, take_date, image, image_hash, result_id, "
+                "created_at, updated_at, deleted_at")
+RESULT_COLUMNS = "id, title, description, created_at, updated_at, deleted_at"
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def finish_cascades(db, batch_size, pause=0.0, dry_run=False, echo=print):
+    """Soft-delete live users whose result is already deleted, e.g. after
+    a DELETE /results/<id> whose cascade was interrupted"""
+    cursor = db.cursor()
+    pending = '''
+        FROM users u
+        JOIN results r ON u.result_id = r.id
+        WHERE r.deleted_at IS NOT NULL AND u.deleted_at IS NULL
+    '''
+    total = 0
+    try:
+        if dry_run:
+            cursor.execute("SELECT COUNT(*) " + pending)
+            return cursor.fetchone()[0]
+
+        while True:
+            cursor.execute("SELECT u.id " + pending + " LIMIT %s FOR UPDATE", (batch_size,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                db.rollback()
+                break
+            # Count the users out of user_stats before they are deleted
+            in_ids = f"id IN ({_placeholders(ids)}) AND deleted_at IS NULL"
+            cursor.execute(StatsModel.rows_delta_query(in_ids, -1),
+                           StatsModel.rows_delta_params(ids))
+            cursor.execute(f'''
+                UPDATE users u
+                JOIN results r ON u.result_id = r.id
+                SET u.deleted_at = r.deleted_at
+                WHERE u.id IN ({_placeholders(ids)}) AND u.deleted_at IS NULL
+            ''', ids)
+            db.commit()
+            total += len(ids)
+            echo(f"users: cascaded delete to {total}")
+            time.sleep(pause)
+    finally:
+        cursor.close()
+    return total
+
+
+def _archive(db, table, archive_table, columns, where, params, batch_size,
+             pause, dry_run, echo):
+    cursor = db.cursor()
+    moved = 0
+    try:
+        if dry_run:
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params)
+            return cursor.fetchone()[0]
+
+        while True:
+            # Oldest deletions first; the rows leave the table, so the next
+            # batch starts at the front of the deleted_at index again
+            cursor.execute(
+                f"SELECT id FROM {table} WHERE {where} ORDER BY deleted_at, id LIMIT %s",
+                params + [batch_size])
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            in_ids = f"id IN ({_placeholders(ids)}) AND {where}"
+            cursor.execute(
+                f"REPLACE INTO {archive_table} ({columns}) "
+                f"SELECT {columns} FROM {table} WHERE {in_ids}", ids + params)
+            cursor.execute(f"DELETE FROM {table} WHERE {in_ids}", ids + params)
+            db.commit()
+            moved += cursor.rowcount
+            echo(f"{table}: archived {moved}")
+            time.sleep(pause)
+    finally:
+        cursor.close()
+    return moved
+
+
+def purge_receipts(db, cutoff, batch_size, pause=0.0, dry_run=False, echo=print):
+    """Drop ingestion receipts (see ingest.py) written before the cutoff"""
+    cursor = db.cursor()
+    deleted = 0
+    try:
+        if dry_run:
+            cursor.execute("SELECT COUNT(*) FROM ingest_receipts WHERE created_at < %s", (cutoff,))
+            return cursor.fetchone()[0]
+        while True:
+            cursor.execute("DELETE FROM ingest_receipts WHERE created_at < %s LIMIT %s",
+                           (cutoff, batch_size))
+            db.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+            echo(f"ingest_receipts: deleted {deleted}")
+            time.sleep(pause)
+    finally:
+        cursor.close()
+    return deleted
+
+
+def purge_deleted(db, older_than_days, batch_size, pause=0.0, dry_run=False, echo=print,
+                  receipts_older_than_hours=None):
+    """Archive users, then results, soft-deleted before the cutoff.
+
+    Results still referenced by any users row stay until those users are
+    archived too (users.result_id is a foreign key). Image blobs stay in
+    the image store; they are content-addressed and may be shared.
+    Ingestion receipts older than `receipts_older_than_hours` go too.
+    Returns counts per step; with dry_run nothing is changed.
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    counts = {"users_cascaded": finish_cascades(db, batch_size, pause, dry_run, echo)}
+
+    counts["users_archived"] = _archive(
+        db, "users", "users_archive", USER_COLUMNS,
+        "deleted_at IS NOT NULL AND deleted_at < %s", [cutoff],
+        batch_size, pause, dry_run, echo)
+
+    counts["results_archived"] = _archive(
+        db, "results", "results_archive", RESULT_COLUMNS,
+        "deleted_at IS NOT NULL AND deleted_at < %s "
+        "AND NOT EXISTS (SELECT 1 FROM users u WHERE u.result_id = results.id)", [cutoff],
+        batch_size, pause, dry_run, echo)
+
+    if receipts_older_than_hours is not None:
+        counts["receipts_purged"] = purge_receipts(
+            db, datetime.now() - timedelta(hours=receipts_older_than_hours),
+            batch_size, pause, dry_run, echo)
+    return counts
@@ -0,0 +1,388 @@
+"""Native async serving stack: Starlette on uvicorn over aiomysql.
+
+Serves the same routes and JSON as app.py, through the shared handlers
+in services/, but every request runs on one event loop and queries use
+native async connections instead of the thread-pool executor:
+
+    uvicorn asgi:application --workers 4
+
+The Flask/Passenger entry point (passenger_wsgi.py) is unchanged, and
+the flask CLI commands stay on app.py.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, HTMLResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import http_date, parse_date
+
+import ingest
+import metrics
+from admission import (AdmissionController, get_admission, get_admission_stats,
+                       request_priority, use_admission)
+from config import settings
+from database import (begin_request, close_native_pools, get_native_pool_stats,
+                      get_pool_stats, get_replica_stats, open_native_pools)
+from json_provider import dumps_bytes
+from services import result as results_service
+from services import stats as stats_service
+from services import user as users_service
+from services.common import (ExportEncoder, QueryArgs, OVERLOADED_MESSAGE, error_payload,
+                             is_overloaded)
+
+UPLOAD_SPOOL_SIZE = 1024 * 1024
+
+
+class JSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps_bytes(content, settings.JSON_DATETIME_FORMAT)
+
+
+def overloaded_response():
+    return JSONResponse({"status": "error", "message": OVERLOADED_MESSAGE}, status_code=503,
+                        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)})
+
+
+def error_response(e):
+    if is_overloaded(e):
+        return overloaded_response()
+    return JSONResponse(error_payload(e), status_code=400)
+
+
+def _dumps(obj):
+    return dumps_bytes(obj, settings.JSON_DATETIME_FORMAT)[:-1].decode()
+
+
+def _not_modified(request, etag, last_modified):
+    """Same precedence as werkzeug: If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or f'"{etag}"' in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = parse_date(if_modified_since)
+        if since is None:
+            return False
+        last_modified = last_modified.replace(microsecond=0)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def conditional_json(request, payload, etag, last_modified):
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    with metrics.stage_duration_seconds.time('results.encode'):
+        return JSONResponse(payload, headers=headers)
+
+
+def export_response(export, columns, filename):
+    export_format, batches = export
+    encoder = ExportEncoder(export_format, columns, _dumps)
+
+    async def generate():
+        header = encoder.header()
+        if header:
+            yield header
+        async for rows in batches:
+            yield encoder.encode(rows)
+
+    return StreamingResponse(generate(), media_type=encoder.mimetype, headers={
+        "Content-Disposition": f"attachment; filename={filename}.{export_format}",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def image_url(request):
+    def build(user_id, version):
+        return f"{request.url_for('get_user_image', user_id=user_id).path}?v={version}"
+    return build
+
+
+def ingest_status_url(request):
+    def build(tracking_id):
+        return request.url_for('get_ingest_status', tracking_id=tracking_id).path
+    return build
+
+
+def query_args(request):
+    return QueryArgs(request.query_params)
+
+
+def handler(func):
+    """Endpoint wrapper: any exception is a 400 with the error payload,
+    as in the Flask routers"""
+    async def endpoint(request):
+        try:
+            return await func(request)
+        except Exception as e:
+            return error_response(e)
+    endpoint.__name__ = func.__name__
+    return endpoint
+
+
+# /users
+
+@handler
+async def create_user(request):
+    if query_args(request).bool('async', False):
+        payload = await users_service.ingest_user(await request.json(), ingest_status_url(request))
+        return JSONResponse(payload, status_code=202,
+                            headers={"Location": payload['data']['status_url']})
+    return JSONResponse(await users_service.create_user(await request.json(), image_url(request)))
+
+
+@handler
+async def get_ingest_status(request):
+    return JSONResponse(await users_service.ingest_status(request.path_params['tracking_id']))
+
+
+@handler
+async def create_users_bulk(request):
+    return JSONResponse(await users_service.create_users_bulk(await request.json()))
+
+
+@handler
+async def get_users(request):
+    return JSONResponse(await users_service.list_users(query_args(request), image_url(request)))
+
+
+@handler
+async def export_users(request):
+    return export_response(users_service.export_users(query_args(request)),
+                           users_service.EXPORT_COLUMNS, 'users')
+
+
+@handler
+async def update_user(request):
+    user_id = request.path_params['user_id']
+    return JSONResponse(await users_service.update_user(
+        user_id, await request.json(), image_url(request)))
+
+
+@handler
+async def delete_user(request):
+    return JSONResponse(await users_service.delete_user(request.path_params['user_id']))
+
+
+@handler
+async def upload_user_image(request):
+    user_id = request.path_params['user_id']
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        try:
+            return JSONResponse(await users_service.upload_user_image(
+                user_id, form['image'].file, image_url(request)))
+        finally:
+            await form.close()
+    # Raw body: spool to disk past UPLOAD_SPOOL_SIZE rather than holding it
+    with tempfile.SpooledTemporaryFile(UPLOAD_SPOOL_SIZE) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        return JSONResponse(await users_service.upload_user_image(
+            user_id, spool, image_url(request)))
+
+
+@handler
+async def get_user_image(request):
+    path, mimetype, image_hash = await users_service.user_image(request.path_params['user_id'])
+    last_modified = datetime.fromtimestamp(os.stat(path).st_mtime, timezone.utc)
+    headers = {
+        "ETag": f'"{image_hash}"',
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": users_service.image_cache_control(
+            request.query_params.get('v'), image_hash),
+    }
+    if _not_modified(request, image_hash, last_modified):
+        return Response(status_code=304, headers=headers)
+    # FileResponse answers Range requests itself
+    return FileResponse(path, media_type=mimetype, headers=headers,
+                        filename=image_hash, content_disposition_type="inline")
+
+
+# /results
+
+@handler
+async def create_result(request):
+    return JSONResponse(await results_service.create_result(await request.json()))
+
+
+@handler
+async def get_results(request):
+    return conditional_json(request, *await results_service.list_results(query_args(request)))
+
+
+@handler
+async def export_results(request):
+    return export_response(results_service.export_results(query_args(request)),
+                           results_service.EXPORT_COLUMNS, 'results')
+
+
+@handler
+async def get_result(request):
+    return conditional_json(request, *await results_service.get_result(request.path_params['result_id']))
+
+
+@handler
+async def update_result(request):
+    return JSONResponse(await results_service.update_result(
+        request.path_params['result_id'], await request.json()))
+
+
+@handler
+async def delete_result(request):
+    return JSONResponse(await results_service.delete_result(request.path_params['result_id']))
+
+
+# /stats
+
+@handler
+async def get_stats(request):
+    return JSONResponse(await stats_service.get_stats(query_args(request)))
+
+
+# service endpoints
+
+async def hello(request):
+    return HTMLResponse("Hello, application is running!")
+
+
+async def prometheus_metrics(request):
+    return Response(metrics.registry.render(),
+                    media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def db_health(request):
+    return JSONResponse({
+        "status": "success",
+        "data": {"pool": get_pool_stats(), "replicas": get_replica_stats(),
+                 "native": get_native_pool_stats(), "admission": get_admission_stats()}
+    })
+
+
+class MetricsMiddleware:
+    """Request metrics and per-request state, like app.py's hooks"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+        metrics.http_requests_in_flight.inc()
+        # Reads after a write in this request go to the primary
+        begin_request()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.http_requests_in_flight.dec()
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            metrics.http_request_duration_seconds.observe(
+                time.perf_counter() - started, route, scope["method"])
+            metrics.http_requests_total.inc(route, scope["method"], status)
+
+
+class AdmissionMiddleware:
+    """Admission control (admission.py) on the event loop; the slot is
+    held until the response, streamed or not, has been sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        admission = get_admission()
+        if scope["type"] != "http" or admission is None:
+            return await self.app(scope, receive, send)
+        priority = request_priority(scope["method"], scope["path"])
+        if priority is None:
+            return await self.app(scope, receive, send)
+        if not await admission.acquire_async(priority):
+            return await overloaded_response()(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await open_native_pools()
+    # The ingest flusher commits through the native pools on this loop
+    ingest.use_event_loop(asyncio.get_running_loop())
+    ingest.resume()
+    try:
+        yield
+    finally:
+        ingest.use_event_loop(None)
+        await close_native_pools()
+
+
+routes = [
+    Route('/users/', create_user, methods=['POST']),
+    Route('/users/bulk', create_users_bulk, methods=['POST']),
+    Route('/users/ingest/{tracking_id}', get_ingest_status, methods=['GET']),
+    Route('/users/', get_users, methods=['GET']),
+    Route('/users/export', export_users, methods=['GET']),
+    Route('/users/{user_id:int}', update_user, methods=['PUT']),
+    Route('/users/{user_id:int}', delete_user, methods=['DELETE']),
+    Route('/users/{user_id:int}/image', upload_user_image, methods=['PUT', 'POST']),
+    Route('/users/{user_id:int}/image', get_user_image, methods=['GET']),
+    Route('/results/', create_result, methods=['POST']),
+    Route('/results/', get_results, methods=['GET']),
+    Route('/results/export', export_results, methods=['GET']),
+    Route('/results/{result_id:int}', get_result, methods=['GET']),
+    Route('/results/{result_id:int}', update_result, methods=['PUT']),
+    Route('/results/{result_id:int}', delete_result, methods=['DELETE']),
+    Route('/stats/', get_stats, methods=['GET']),
+    Route('/', hello),
+    Route('/metrics', prometheus_metrics),
+    Route('/health/db', db_health),
+]
+
+use_admission(AdmissionController(settings.ADMISSION_MAX_CONCURRENT_ASYNC,
+                                  settings.ADMISSION_MAX_QUEUE,
+                                  settings.ADMISSION_QUEUE_TIMEOUT)
+              if settings.ADMISSION_MAX_CONCURRENT_ASYNC > 0 else None)
+
+middleware = [
+    Middleware(MetricsMiddleware),
+    Middleware(CORSMiddleware,
+               allow_origins=["https://porcalabs.github.io"],
+               allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+               allow_headers=["*"],
+               expose_headers=["*"],
+               allow_credentials=True,
+               max_age=3600),
+    # gzip only here; brotli negotiation lives in the Flask app (compression.py)
+    Middleware(GZipMiddleware, minimum_size=settings.COMPRESS_MIN_SIZE,
+               compresslevel=settings.COMPRESS_GZIP_LEVEL),
+    Middleware(AdmissionMiddleware),
+]
+
+application = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
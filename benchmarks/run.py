@@ -0,0 +1,194 @@
+"""Drive the Flask app in-process and record per-endpoint latency.
+
+Requests go through app.test_client(), so the only I/O is the database
+named by the DB_* environment variables (seed it with benchmarks.seed):
+
+    DB_HOST=127.0.0.1 DB_NAME=sebi_bench python -m benchmarks.run \
+        --concurrency 8 --requests 500 --scenario list --scenario create
+
+Results are written as JSON under benchmarks/results/ (or --output), and
+--compare prints the change against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import app
+from config import settings
+from database import get_db_connection
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class Fixture:
+    """IDs and sizes the scenarios draw from, read once before the run"""
+
+    def __init__(self, limit=10):
+        db = get_db_connection()
+        cursor = db.cursor()
+        try:
+            cursor.execute("SELECT id FROM results WHERE deleted_at IS NULL")
+            self.result_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT COUNT(*) FROM users WHERE deleted_at IS NULL")
+            self.user_count = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT id FROM users WHERE deleted_at IS NULL ORDER BY id DESC LIMIT 10000")
+            self.user_ids = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            db.close()
+        if not self.result_ids or not self.user_ids:
+            raise SystemExit("database is empty; run python -m benchmarks.seed first")
+
+        self.limit = limit
+        self.deep_page = max(1, self.user_count // limit - 1)
+        self._delete_ids = list(self.user_ids)
+        self._lock = threading.Lock()
+
+    def next_delete_id(self):
+        with self._lock:
+            return self._delete_ids.pop() if self._delete_ids else random.choice(self.user_ids)
+
+
+def new_user(fixture):
+    return {
+        "name": f"Bench User {random.randint(0, 10 ** 6)}",
+        "no_hp": "08" + "".join(random.choice("0123456789") for _ in range(10)),
+        "prodi": "Teknik Informatika",
+        "take_date": datetime.now().isoformat(),
+        "result_id": random.choice(fixture.result_ids),
+    }
+
+
+# name -> callable(fixture) returning (method, url, json body)
+SCENARIOS = {
+    "list": lambda f: ("GET", f"/users/?page=1&limit={f.limit}", None),
+    "list_search": lambda f: ("GET", f"/users/?search=budi&limit={f.limit}", None),
+    "list_deep": lambda f: ("GET", f"/users/?page={f.deep_page}&limit={f.limit}", None),
+    "list_no_total": lambda f: ("GET", f"/users/?with_total=false&limit={f.limit}", None),
+    "create": lambda f: ("POST", "/users/", new_user(f)),
+    "update": lambda f: ("PUT", f"/users/{random.choice(f.user_ids)}", new_user(f)),
+    "delete": lambda f: ("DELETE", f"/users/{f.next_delete_id()}", None),
+    "results_list": lambda f: ("GET", f"/results/?limit={f.limit}", None),
+    "result_get": lambda f: ("GET", f"/results/{random.choice(f.result_ids)}", None),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(name, fixture, requests, concurrency, warmup):
+    build = SCENARIOS[name]
+    local = threading.local()
+
+    def one_request(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        method, url, body = build(fixture)
+        started = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        elapsed = time.perf_counter() - started
+        response.close()
+        return elapsed, response.status_code < 400
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(warmup)))
+        started = time.perf_counter()
+        samples = list(pool.map(one_request, range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _ in samples)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in samples if not ok),
+        "throughput_rps": round(requests / wall, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, report):
+    with open(previous_path) as f:
+        previous = json.load(f)["scenarios"]
+    print(f"\nchange vs {previous_path}:")
+    for name, stats in report["scenarios"].items():
+        old = previous.get(name)
+        if not old:
+            continue
+        for key in ("throughput_rps", "p50_ms", "p99_ms"):
+            delta = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {name:<14} {key:<15} {old[key]:>10} -> {stats[key]:>10} ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10, help="page size for list scenarios")
+    parser.add_argument("--output", help="JSON report path")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    args = parser.parse_args()
+
+    fixture = Fixture(limit=args.limit)
+    # Destructive scenarios last so reads see the seeded data set
+    names = args.scenario or [name for name in SCENARIOS if name != "delete"] + ["delete"]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": fixture.user_count,
+            "db_pool_size": settings.DB_POOL_SIZE,
+        },
+        "scenarios": {},
+    }
+
+    for name in names:
+        stats = run_scenario(name, fixture, args.requests, args.concurrency, args.warmup)
+        report["scenarios"][name] = stats
+        print(f"{name:<14} {stats['throughput_rps']:>9.1f} req/s  "
+              f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+              f"p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Seed a local MySQL-compatible server for the benchmark suite.
+
+Connection settings come from the usual DB_* environment variables, e.g.
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD= DB_NAME=sebi_bench \
+        python -m benchmarks.seed --users 100000 --results 50 --reset
+
+Only local hosts are accepted unless --force is given, so a benchmark run
+can never truncate a shared database.
+"""
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from config import settings
+from database import get_db_connection
+from migrate import load_migrations, migrate
+from models.stats import StatsModel
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+FIRST_NAMES = ["Budi", "Siti", "Agus", "Dewi", "Rizky", "Putri", "Andi", "Nur",
+               "Fajar", "Ayu", "Dimas", "Lestari", "Yusuf", "Indah", "Bayu"]
+LAST_NAMES = ["Santoso", "Wijaya", "Saputra", "Lestari", "Pratama", "Hidayat",
+              "Kusuma", "Nugroho", "Rahmawati", "Setiawan", "Utami", "Purnomo"]
+PRODI = ["Teknik Informatika", "Sistem Informasi", "Manajemen", "Akuntansi",
+         "Psikologi", "Hukum", "Kedokteran", "Teknik Sipil", "Farmasi"]
+
+
+def migration_tables():
+    """Every table the migrations create, in creation order"""
+    tables = []
+    for migration in load_migrations():
+        for statement in migration.statements():
+            match = re.match(r"CREATE TABLE (?:IF NOT EXISTS )?`?(\w+)`?", statement, re.IGNORECASE)
+            if match and match.group(1) not in tables:
+                tables.append(match.group(1))
+    return tables
+
+
+def create_schema(db):
+    cursor = db.cursor()
+    try:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in reversed(migration_tables() + ["schema_migrations"]):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    finally:
+        cursor.close()
+    migrate(db)
+
+
+def seed(users, results, batch_size, reset):
+    rng = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        if reset:
+            create_schema(db)
+
+        cursor.executemany(
+            "INSERT INTO results (title, description, created_at, updated_at) "
+            "VALUES (%s, %s, %s, %s)",
+            [(f"Sesi Ujian {i + 1}", f"Hasil sesi ujian ke-{i + 1}", now, now)
+             for i in range(results)])
+        db.commit()
+        cursor.execute("SELECT id FROM results")
+        result_ids = [row[0] for row in cursor.fetchall()]
+
+        insert_query = '''
+        INSERT INTO users (name, no_hp, prodi, take_date, result_id, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        '''
+        started = time.perf_counter()
+        for start in range(0, users, batch_size):
+            rows = []
+            for _ in range(min(batch_size, users - start)):
+                created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+                rows.append((
+                    f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    "08" + "".join(rng.choice("0123456789") for _ in range(10)),
+                    rng.choice(PRODI),
+                    (created_at - timedelta(days=rng.randint(0, 30))).date(),
+                    rng.choice(result_ids),
+                    created_at,
+                    created_at,
+                ))
+            cursor.executemany(insert_query, rows)
+            db.commit()
+            print(f"seeded {start + len(rows)}/{users} users")
+
+        # Rows inserted here bypass the models, so recount user_stats
+        for query, params in StatsModel.rebuild_queries():
+            cursor.execute(query, params)
+        db.commit()
+
+        cursor.execute("ANALYZE TABLE users, results, user_stats")
+        cursor.fetchall()
+        print(f"done in {time.perf_counter() - started:.1f}s")
+    finally:
+        cursor.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--results", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true",
+                        help="drop the tables and rebuild the schema from migrations/")
+    parser.add_argument("--force", action="store_true",
+                        help="allow a non-local DB_HOST")
+    args = parser.parse_args()
+
+    if settings.DB_HOST not in LOCAL_HOSTS and not args.force:
+        parser.error(f"refusing to seed non-local host {settings.DB_HOST!r}; "
+                     "set DB_HOST=127.0.0.1 or pass --force")
+
+    seed(args.users, args.results, args.batch_size, args.reset)
+
+
+if __name__ == "__main__":
+    main()
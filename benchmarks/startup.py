@@ -0,0 +1,117 @@
+"""Cold-start report: import cost per module and first vs warm request latency.
+
+Each measurement runs in a fresh interpreter, like a recycled Passenger
+worker. The exit status is 1 when a budget is exceeded, so this doubles
+as the startup budget check:
+
+    python -m benchmarks.startup --import-budget-ms 500 --first-request-budget-ms 25
+    DB_HOST=127.0.0.1 DB_NAME=sebi_bench python -m benchmarks.startup \
+        --path "/results/?limit=10" --warmup
+
+Without a reachable database, point --path at a route that needs none.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_report(module):
+    """[(cumulative_us, self_us, depth, name)] from python -X importtime"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((cumulative_us, self_us, depth, name.strip()))
+    return rows
+
+
+def child(path, requests, warmup):
+    """Runs inside the fresh interpreter; prints one JSON line"""
+    started = time.perf_counter()
+    from app import app
+    imported = time.perf_counter()
+    if warmup:
+        from warmup import warm_up
+        warm_up(app)
+    ready = time.perf_counter()
+
+    client = app.test_client()
+    latencies = []
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        client.get(path).close()
+        latencies.append((time.perf_counter() - request_started) * 1000)
+
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "warmup_ms": (ready - imported) * 1000,
+        "first_ms": latencies[0],
+        "warm_ms": sorted(latencies[1:])[len(latencies[1:]) // 2],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app", help="module to profile imports of")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--path", default="/", help="route for the first-request check")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--warmup", action="store_true", help="run warmup.warm_up() first")
+    parser.add_argument("--import-budget-ms", type=float, default=500.0)
+    parser.add_argument("--first-request-budget-ms", type=float, default=25.0,
+                        help="allowed first-request latency above the warm median")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.path, max(args.requests, 2), args.warmup)
+        return
+
+    rows = import_report(args.module)
+    total_ms = sum(cumulative for cumulative, _, depth, _ in rows if depth == 0) / 1000
+    print(f"import {args.module}: {total_ms:.1f} ms across {len(rows)} modules\n")
+    print(f"{'cumulative':>12} {'self':>9}  module")
+    for cumulative, self_us, depth, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>10.1f}ms {self_us / 1000:>7.1f}ms  {'  ' * depth}{name}")
+
+    command = [sys.executable, "-m", "benchmarks.startup", "--child",
+               "--path", args.path, "--requests", str(args.requests)]
+    if args.warmup:
+        command.append("--warmup")
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    timing = json.loads(output.stdout.strip().splitlines()[-1])
+    excess = timing["first_ms"] - timing["warm_ms"]
+    print(f"\nGET {args.path}: import {timing['import_ms']:.1f} ms, "
+          f"warm-up {timing['warmup_ms']:.1f} ms, first request {timing['first_ms']:.2f} ms, "
+          f"warm median {timing['warm_ms']:.2f} ms (+{excess:.2f} ms)")
+
+    failures = []
+    if total_ms > args.import_budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms > budget {args.import_budget_ms} ms")
+    if excess > args.first_request_budget_ms:
+        failures.append(f"first request {excess:.1f} ms slower than warm "
+                        f"> budget {args.first_request_budget_ms} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("startup within budget")
+
+
+if __name__ == "__main__":
+    main()
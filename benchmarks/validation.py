@@ -0,0 +1,89 @@
+"""Per-row cost of response validation for the results and users schemas.
+
+    python -m benchmarks.validation --rows 1000 --repeat 50
+
+No database is needed; rows are synthetic but shaped like the SELECTs.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from schemas.result import ResultResponse
+from schemas.user import UserRow
+from schemas.validation import validate_rows
+
+
+def result_rows(n):
+    now = datetime.now().replace(microsecond=0)
+    return [{
+        "id": i,
+        "title": f"Sesi Ujian {i}",
+        "description": "Hasil sesi ujian",
+        "created_at": now - timedelta(minutes=i),
+        "updated_at": now,
+    } for i in range(n)]
+
+
+def user_rows(n):
+    now = datetime.now().replace(microsecond=0)
+    return [{
+        "id": i,
+        "name": f"User {i}",
+        "no_hp": "081234567890",
+        "prodi": "Teknik Informatika",
+        "take_date": date.today(),
+        "image_hash": "ab" * 32,
+        "result_id": 1,
+        "result_title": "Sesi Ujian 1",
+        "created_at": now - timedelta(minutes=i),
+        "updated_at": now,
+        "deleted_at": None,
+    } for i in range(n)]
+
+
+def per_row_model_dump(model, rows):
+    # What routers/result.py used to do for every row
+    return [model(**row).model_dump() for row in rows]
+
+
+def per_row_validate(model, rows):
+    for row in rows:
+        model.model_validate(row)
+    return rows
+
+
+STRATEGIES = {
+    "per-row model + model_dump": per_row_model_dump,
+    "per-row model_validate": per_row_validate,
+    "list TypeAdapter (full)": lambda model, rows: validate_rows(model, rows, "full"),
+    "sampled": lambda model, rows: validate_rows(model, rows, "sample"),
+    "trusted (off)": lambda model, rows: validate_rows(model, rows, "off"),
+}
+
+
+def measure(strategy, model, rows, repeat):
+    strategy(model, rows)  # warm up adapters/caches
+    started = time.perf_counter()
+    for _ in range(repeat):
+        strategy(model, rows)
+    return (time.perf_counter() - started) / (repeat * len(rows)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for model, rows in ((ResultResponse, result_rows(args.rows)),
+                        (UserRow, user_rows(args.rows))):
+        print(f"{model.__name__} ({args.rows} rows x {args.repeat})")
+        baseline = None
+        for name, strategy in STRATEGIES.items():
+            cost = measure(strategy, model, rows, args.repeat)
+            baseline = baseline or cost
+            print(f"  {name:<28} {cost:8.3f} us/row  {baseline / cost:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import click
+from archive import purge_deleted as archive_deleted
+from config import settings
+from database import get_db_connection
+import migrate as migrations
+from storage import get_image_store, decode_image_payload
+
+
+@click.command('migrate-images')
+@click.option('--batch-size', default=100, show_default=True)
+def migrate_images(batch_size):
+    """Move base64 images out of users.image into the image store."""
+    store = get_image_store()
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True, buffered=True)
+    last_id = 0
+    moved = failed = 0
+    try:
+        while True:
+            cursor.execute('''
+                SELECT id, image FROM users
+                WHERE id > %s AND image IS NOT NULL AND image <> ''
+                ORDER BY id
+                LIMIT %s
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                last_id = row['id']
+                try:
+                    image_hash = store.save_bytes(decode_image_payload(row['image']))
+                except ValueError as e:
+                    click.echo(f"user {row['id']}: {e}", err=True)
+                    failed += 1
+                    continue
+                cursor.execute(
+                    "UPDATE users SET image_hash = %s, image = NULL WHERE id = %s",
+                    (image_hash, row['id']))
+                moved += 1
+            db.commit()
+            click.echo(f"moved {moved} images (up to user {last_id})")
+    finally:
+        cursor.close()
+        db.close()
+
+    click.echo(f"done: {moved} moved, {failed} failed")
+
+
+@click.command('db-migrate')
+@click.option('--target', type=int, help="Stop after this version.")
+@click.option('--fake', is_flag=True,
+              help="Record pending migrations as applied without running them.")
+def db_migrate(target, fake):
+    """Apply pending schema migrations in version order."""
+    db = get_db_connection()
+    try:
+        done = migrations.migrate(db, target=target, fake=fake, echo=click.echo)
+    finally:
+        db.close()
+    click.echo(f"done: {len(done)} migration(s) applied" if done else "schema is up to date")
+
+
+@click.command('db-status')
+def db_status():
+    """List migrations and whether each has been applied."""
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        for migration, state in migrations.status(cursor):
+            click.echo(f"{state:<9} {migration.name}")
+    finally:
+        cursor.close()
+        db.close()
+
+
+@click.command('db-explain')
+def db_explain():
+    """EXPLAIN the model queries; fail on an unexpected full scan or filesort."""
+    from query_plans import check_plans
+
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True, buffered=True)
+    try:
+        report = check_plans(cursor)
+    finally:
+        cursor.close()
+        db.close()
+
+    failed = 0
+    for name, plan, problems in report:
+        access = ", ".join(f"{row['table']}:{row['type']}/{row.get('key') or '-'}" for row in plan)
+        if problems:
+            failed += 1
+            found = ", ".join(f"{problem} on {table}" for problem, table in problems)
+            click.echo(f"FAIL {name}: {found} [{access}]")
+        else:
+            click.echo(f"ok   {name} [{access}]")
+    if failed:
+        raise click.ClickException(f"{failed} of {len(report)} queries have a regressed plan")
+
+
+@click.command('purge-deleted')
+@click.option('--days', type=int, default=settings.PURGE_AFTER_DAYS, show_default=True,
+              help="Archive rows soft-deleted more than this many days ago.")
+@click.option('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE, show_default=True)
+@click.option('--pause', type=float, default=settings.PURGE_PAUSE, show_default=True,
+              help="Seconds to sleep between batches.")
+@click.option('--dry-run', is_flag=True, help="Only count what would be moved.")
+def purge_deleted(days, batch_size, pause, dry_run):
+    """Move long soft-deleted users and results into the archive tables."""
+    db = get_db_connection()
+    try:
+        counts = archive_deleted(db, days, batch_size, pause, dry_run, echo=click.echo,
+                                 receipts_older_than_hours=settings.INGEST_RETENTION_HOURS)
+    finally:
+        db.close()
+    prefix = "would move" if dry_run else "done"
+    click.echo(f"{prefix}: " + ", ".join(f"{key} {value}" for key, value in counts.items()))
+
+
+@click.command('stats-rebuild')
+def stats_rebuild():
+    """Recompute user_stats from the users table (backfill or repair)."""
+    from models.stats import StatsModel
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        # One transaction: readers see the old counts until the commit,
+        # and user writes wait on the locks instead of being lost
+        for query, params in StatsModel.rebuild_queries():
+            cursor.execute(query, params)
+        db.commit()
+        cursor.execute("SELECT COUNT(*) FROM user_stats")
+        buckets = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        db.close()
+    click.echo(f"done: {buckets} buckets")
+
+
+@click.command('ingest-flush')
+@click.option('--batch-size', type=int, default=settings.INGEST_BATCH_SIZE, show_default=True)
+def ingest_flush(batch_size):
+    """Commit every pending queued user submission to MySQL now."""
+    from ingest import IngestQueue, flush_batch
+
+    queue = IngestQueue(settings.INGEST_QUEUE_PATH)
+    total = 0
+    while True:
+        claimed = flush_batch(queue, batch_size)
+        if not claimed:
+            break
+        total += claimed
+        click.echo(f"flushed {total}")
+    click.echo(f"done: {total} flushed, {queue.pending_count()} still pending")
+
+
+def register_commands(app):
+    app.cli.add_command(migrate_images)
+    app.cli.add_command(db_migrate)
+    app.cli.add_command(db_status)
+    app.cli.add_command(db_explain)
+    app.cli.add_command(purge_deleted)
+    app.cli.add_command(stats_rebuild)
+    app.cli.add_command(ingest_flush)
@@ -0,0 +1,52 @@
+"""Negotiated response compression for the Flask app.
+
+JSON and text bodies of at least COMPRESS_MIN_SIZE bytes are sent with
+brotli (when the optional `brotli` package is installed) or gzip,
+whichever the client's Accept-Encoding ranks higher; brotli wins ties.
+Streamed responses (exports, files) are left alone.
+"""
+import gzip
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/plain", "text/html")
+
+
+def _encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=settings.COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, request):
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.direct_passthrough or response.is_streamed):
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.content_length is None
+            or response.content_length < settings.COMPRESS_MIN_SIZE):
+        return response
+
+    encoding = request.accept_encodings.best_match(_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(_compress(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is a different byte sequence; a weak ETag keeps
+    # If-None-Match revalidation working (RFC 9110 weak comparison)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
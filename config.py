@@ -1,10 +1,122 @@
-from pydantic_settings import BaseSettings
+import os
 
-class Settings(BaseSettings):
+
+class EnvSettings:
+    """Class attributes are the defaults; an environment variable with the
+    same name (any case) overrides one, converted to the annotated type.
+
+    Plain Python rather than pydantic-settings, whose imports were a large
+    share of a cold worker's boot.
+    """
+
+    def __init__(self):
+        env = {key.upper(): value for key, value in os.environ.items()}
+        for name, kind in type(self).__annotations__.items():
+            if name in env:
+                setattr(self, name, self._convert(name, kind, env[name]))
+
+    @staticmethod
+    def _convert(name, kind, value):
+        if kind is bool:
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        try:
+            return kind(value)
+        except ValueError as e:
+            raise ValueError(f"{name}: expected {kind.__name__}, got {value!r}") from e
+
+
+class Settings(EnvSettings):
     DB_HOST: str = "porcalabs.com"
     DB_USER: str = "u1609838_miftahsebi"
     DB_PASSWORD: str = "Miftah99"
     DB_NAME: str = "u1609838_sebi_db"
 
-settings = Settings()
+    # Connection pool
+    DB_POOL_SIZE: int = 5
+    DB_POOL_TIMEOUT: float = 10.0         # seconds to wait when the pool is exhausted
+    DB_POOL_MAX_USES: int = 1000          # recycle a connection after this many checkouts
+    DB_POOL_MAX_IDLE: float = 300.0       # recycle a connection idle for longer than this
+    DB_POOL_PING_INTERVAL: float = 30.0   # ping before checkout if idle longer than this
+
+    # Read replicas, "host[:port],host[:port]"; same user, password and
+    # database as the primary. Empty: every query goes to DB_HOST
+    DB_REPLICA_HOSTS: str = ""
+    DB_REPLICA_MAX_LAG: float = 5.0         # seconds behind the primary before a replica is skipped
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0  # how often each replica's lag is measured
+    DB_REPLICA_RETRY_AFTER: float = 30.0    # how long an unreachable replica sits out
+
+    # aiomysql pool size per host when served by asgi.py; connections are
+    # not tied to threads there, so this can exceed DB_POOL_SIZE
+    DB_ASYNC_POOL_SIZE: int = 20
+
+    # Threads that run blocking driver calls for the async models
+    DB_EXECUTOR_WORKERS: int = 10
+
+    # Cached totals for GET /users, keyed on the filter set
+    USER_COUNT_CACHE_TTL: float = 30.0
+    USER_COUNT_CACHE_SIZE: int = 256
+
+    # User images live outside the users row, addressed by sha256
+    IMAGE_STORE_BACKEND: str = "storage.LocalImageStore"
+    IMAGE_STORE_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        "uploads", "images")
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+
+    # In-process cache in front of ResultModel reads; other workers see a
+    # write once their entries expire
+    RESULT_CACHE_TTL: float = 5.0
+    RESULT_CACHE_SIZE: int = 512
 
+    # POST /users/bulk
+    BULK_MAX_ITEMS: int = 5000
+    BULK_INSERT_CHUNK_SIZE: int = 500
+
+    # GET /users/?ids= and /results/?ids=
+    BATCH_LOOKUP_MAX_IDS: int = 100
+
+    # GET /users/export
+    EXPORT_FETCH_SIZE: int = 1000
+
+    # "http" (RFC 822, Flask's historical format) or "iso" (ISO 8601, faster)
+    JSON_DATETIME_FORMAT: str = "http"
+
+    # Negotiated gzip / brotli for JSON and text responses (see compression.py)
+    COMPRESS_MIN_SIZE: int = 1024         # bytes; smaller bodies are sent as they are
+    COMPRESS_GZIP_LEVEL: int = 6
+    COMPRESS_BROTLI_QUALITY: int = 4      # 0-11; higher is much slower on dynamic responses
+
+    # Response schema checks on DB rows: "full", "sample" or "off"
+    RESPONSE_VALIDATION: str = "full"
+    RESPONSE_VALIDATION_SAMPLE_RATE: float = 0.01
+
+    # Soft-delete lifecycle: DELETE /results/<id> cascades to its users in
+    # batches; `flask purge-deleted` archives rows deleted long enough ago
+    RESULT_DELETE_BATCH_SIZE: int = 1000
+    PURGE_AFTER_DAYS: int = 30
+    PURGE_BATCH_SIZE: int = 500
+    PURGE_PAUSE: float = 0.05             # seconds between batches, lets replication and other writers in
+
+    # Admission control per worker (see admission.py): concurrent
+    # DB-bound requests, then a short queue, then 503 + Retry-After
+    ADMISSION_MAX_CONCURRENT: int = 5     # WSGI worker; 0 disables
+    ADMISSION_MAX_CONCURRENT_ASYNC: int = 20  # asgi.py worker
+    ADMISSION_MAX_QUEUE: int = 50
+    ADMISSION_QUEUE_TIMEOUT: float = 3.0  # seconds a request may wait
+    ADMISSION_RETRY_AFTER: int = 2        # seconds, sent to shed clients
+
+    # Write-behind ingestion, POST /users/?async=1 (see ingest.py)
+    INGEST_QUEUE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          "uploads", "ingest", "queue.sqlite3")
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_FLUSH_INTERVAL: float = 0.5    # seconds between group commits
+    INGEST_RETRY_AFTER: float = 5.0       # back-off after a failed flush
+    INGEST_MAX_ATTEMPTS: int = 5          # an entry MySQL keeps refusing is marked failed after this
+    INGEST_CLAIM_TIMEOUT: float = 300.0   # a batch claimed by a dead worker is retried after this
+    INGEST_RETENTION_HOURS: float = 24.0  # tracking ids stay queryable this long
+
+    # Boot-time warm-up from passenger_wsgi (see warmup.py)
+    WARMUP_ON_START: bool = True
+    WARMUP_DB_CONNECTIONS: int = 2
+
+
+settings = Settings()
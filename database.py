@@ -1,15 +1,798 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.constants import ClientFlag
+from mysql.connector import errors
+from mysql.connector.errors import PoolError
 from config import settings
+from executor import run_blocking
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """No connection freed up within the pool timeout: the worker is overloaded"""
+
+
+class _PoolEntry:
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+        self.uses = 0
+
+
+class PooledConnection:
+    """Proxy around a pooled connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._entry.connection, name)
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def discard(self):
+        """Close the connection instead of handing it back"""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.discard(entry)
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout, max_uses, max_idle, ping_interval, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+        self._connect_args = connect_args
+        self._idle = deque()
+        self._opened = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "recycled": 0,
+            "failed_health_checks": 0,
+            "wait_time_total": 0.0,
+        }
+
+    def _connect(self):
+        return mysql.connector.connect(**self._connect_args)
+
+    def _discard(self, entry):
+        try:
+            entry.connection.close()
+        except Error:
+            pass
+
+    def _is_expired(self, entry, now):
+        return (entry.uses >= self.max_uses
+                or now - entry.last_used > self.max_idle)
+
+    def _is_healthy(self, entry, now):
+        if now - entry.last_used <= self.ping_interval:
+            return True
+        try:
+            entry.connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def get_connection(self, timeout=None):
+        """Borrow a connection, waiting up to `timeout` seconds (the pool's
+        timeout by default; 0 never waits) for one to free up"""
+        if timeout is None:
+            timeout = self.timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Timed out after {timeout}s waiting for a database connection")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += time.monotonic() - started
+
+        try:
+            if entry is not None:
+                now = time.monotonic()
+                if self._is_expired(entry, now):
+                    self._stats["recycled"] += 1
+                    self._discard(entry)
+                    entry = None
+                elif not self._is_healthy(entry, now):
+                    self._stats["failed_health_checks"] += 1
+                    self._discard(entry)
+                    entry = None
+            if entry is None:
+                entry = _PoolEntry(self._connect())
+        except Error:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        entry.uses += 1
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if entry.connection.in_transaction:
+                entry.connection.rollback()
+            reusable = entry.uses < self.max_uses
+        except Error:
+            reusable = False
+
+        with self._cond:
+            if reusable:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._stats["recycled"] += 1
+                self._opened -= 1
+            self._cond.notify()
+
+        if not reusable:
+            self._discard(entry)
+
+    def discard(self, entry):
+        """Close a borrowed connection whose session state must not be reused"""
+        with self._cond:
+            self._stats["recycled"] += 1
+            self._opened -= 1
+            self._cond.notify()
+        self._discard(entry)
+
+    def prefill(self, count):
+        """Open up to `count` connections now so early requests skip the handshake"""
+        borrowed = []
+        try:
+            for _ in range(min(count, self.size)):
+                borrowed.append(self.get_connection())
+        finally:
+            for conn in borrowed:
+                conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "idle": len(self._idle),
+                "in_use": self._opened - len(self._idle),
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _make_pool(host, port=3306):
+    return ConnectionPool(
+        size=settings.DB_POOL_SIZE,
+        timeout=settings.DB_POOL_TIMEOUT,
+        max_uses=settings.DB_POOL_MAX_USES,
+        max_idle=settings.DB_POOL_MAX_IDLE,
+        ping_interval=settings.DB_POOL_PING_INTERVAL,
+        host=host,
+        port=port,
+        user=settings.DB_USER,
+        passwd=settings.DB_PASSWORD,
+        database=settings.DB_NAME,
+        # UPDATE rowcount = rows matched, so a no-op update of an
+        # existing row is not mistaken for a missing one
+        client_flags=[ClientFlag.FOUND_ROWS]
+    )
+
+
+def get_pool():
+    """Pool for the primary (DB_HOST); all writes go here"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _make_pool(settings.DB_HOST)
+    return _pool
+
+
+class Replica:
+    """One read replica: its own pool plus the last measured health"""
+
+    def __init__(self, host, port, pool):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.lag = None
+        self.healthy = False
+        self.checked_at = None
+        self.down_until = 0.0
+        self._checking = threading.Lock()
+
+    @property
+    def label(self):
+        return f"{self.host}:{self.port}"
+
+    def _replication_status(self):
+        conn = self.pool.get_connection(timeout=0)
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            try:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except Error:
+                    # MySQL before 8.0.22 only knows the old name
+                    cursor.execute("SHOW SLAVE STATUS")
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def refresh(self, max_lag, retry_after):
+        """Measure replication lag (needs REPLICATION CLIENT). A replica
+        that is unreachable, not replicating or too far behind is skipped;
+        one that fails to connect sits out `retry_after` seconds."""
+        if not self._checking.acquire(blocking=False):
+            return  # another thread is measuring; use the last result
+        try:
+            row = self._replication_status()
+            lag = None
+            if row:
+                lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+            self.lag = None if lag is None else float(lag)
+            self.healthy = self.lag is not None and self.lag <= max_lag
+            if not self.healthy:
+                logger.warning("replica %s skipped: lag %s", self.label, self.lag)
+        except PoolError:
+            pass  # pool busy with reads: the replica answers, keep its state
+        except Error as e:
+            self.mark_down(retry_after)
+            logger.warning("replica %s unreachable: %s", self.label, e)
+        finally:
+            self.checked_at = time.monotonic()
+            self._checking.release()
+
+    def mark_down(self, retry_after):
+        self.healthy = False
+        self.lag = None
+        self.down_until = time.monotonic() + retry_after
+
+    def stats(self):
+        return {"replica": self.label, "healthy": self.healthy, "lag": self.lag,
+                "pool": self.pool.stats()}
+
+
+class ReplicaSet:
+    """Round-robin over replicas that are up and within DB_REPLICA_MAX_LAG"""
+
+    def __init__(self, replicas, max_lag, check_interval, retry_after):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self._next = itertools.count()
+
+    def choose(self, exclude=()):
+        """Next replica that is up and within the lag limit, or None.
+        May block while a stale replica's lag is measured."""
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica in exclude:
+                continue
+            now = time.monotonic()
+            if now < replica.down_until:
+                continue
+            if replica.checked_at is None or now - replica.checked_at > self.check_interval:
+                replica.refresh(self.max_lag, self.retry_after)
+            if replica.healthy:
+                return replica
+        return None
+
+    def get_connection(self):
+        """Connection to a usable replica, or None when there is none or
+        all are busy. Never waits on a busy replica: the caller's fallback,
+        the primary, is the one place a read waits for a connection."""
+        tried = set()
+        while True:
+            replica = self.choose(tried)
+            if replica is None:
+                return None
+            tried.add(replica)
+            try:
+                return replica.pool.get_connection(timeout=0)
+            except PoolError:
+                continue  # busy, not broken: try the next one
+            except Error as e:
+                replica.mark_down(self.retry_after)
+                logger.warning("replica %s failed over: %s", replica.label, e)
+
+    def stats(self):
+        return [replica.stats() for replica in self.replicas]
+
+
+_replicas = None
+
+
+def get_replicas():
+    """Replicas from DB_REPLICA_HOSTS ("host[:port],..."); None if unset"""
+    global _replicas
+    if _replicas is None and settings.DB_REPLICA_HOSTS.strip():
+        with _pool_lock:
+            if _replicas is None:
+                replicas = []
+                for spec in settings.DB_REPLICA_HOSTS.split(","):
+                    host, _, port = spec.strip().partition(":")
+                    port = int(port) if port else 3306
+                    replicas.append(Replica(host, port, _make_pool(host, port)))
+                _replicas = ReplicaSet(
+                    replicas,
+                    max_lag=settings.DB_REPLICA_MAX_LAG,
+                    check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+                    retry_after=settings.DB_REPLICA_RETRY_AFTER,
+                )
+    return _replicas
+
+
+# Per-request routing state; a dict so that writes made inside run_async
+# tasks (which run on a copy of the context) are still seen by the request
+_routing = ContextVar("db_routing", default=None)
+
+
+def begin_request():
+    """Start read-your-writes tracking for the current request"""
+    _routing.set({"wrote": False})
+
+
+def _mark_write():
+    state = _routing.get()
+    if state is not None:
+        state["wrote"] = True
+
+
+def _wrote_in_request():
+    state = _routing.get()
+    return state is not None and state["wrote"]
+
+
+def get_read_connection():
+    """Replica connection for a read, falling back to the primary when no
+    replica is usable"""
+    replicas = get_replicas()
+    if replicas is not None:
+        conn = replicas.get_connection()
+        if conn is not None:
+            return conn
+    return get_db_connection()
 
 
 def get_db_connection():
+    """Borrow a connection from the pool; call close() to return it"""
+    return get_pool().get_connection()
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+def get_replica_stats():
+    replicas = get_replicas()
+    return replicas.stats() if replicas is not None else []
+
+
+def _collect_pool_metrics():
+    if _pool is None:
+        return
+    stats = _pool.stats()
+    for state in ("open", "idle", "in_use", "waiting"):
+        metrics.db_pool_connections.set(state, value=stats[state])
+    if _replicas is not None:
+        for replica in _replicas.replicas:
+            metrics.db_replica_healthy.set(replica.label, value=int(replica.healthy))
+            if replica.lag is not None:
+                metrics.db_replica_lag_seconds.set(replica.label, value=replica.lag)
+
+
+metrics.registry.add_collector(_collect_pool_metrics)
+
+
+class AsyncCursor:
+    """Awaitable wrapper around a mysql.connector dictionary cursor"""
+
+    def __init__(self, cursor, buffered, name):
+        self._cursor = cursor
+        self._buffered = buffered
+        self._name = name
+        # False while an unbuffered result still has rows on the wire
+        self.drained = True
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, query, params=()):
+        self.drained = self._buffered
+        with metrics.db_query_duration_seconds.time(self._name):
+            await run_blocking(self._cursor.execute, query, params)
+
+    async def executemany(self, query, seq_params):
+        with metrics.db_query_duration_seconds.time(self._name):
+            await run_blocking(self._cursor.executemany, query, seq_params)
+
+    # Buffered cursors already hold every row, so fetching is pure memory
+    async def fetchone(self):
+        if self._buffered:
+            return self._cursor.fetchone()
+        row = await run_blocking(self._cursor.fetchone)
+        self.drained = row is None
+        return row
+
+    async def fetchall(self):
+        if self._buffered:
+            return self._cursor.fetchall()
+        rows = await run_blocking(self._cursor.fetchall)
+        self.drained = True
+        return rows
+
+    async def fetchmany(self, size):
+        if self._buffered:
+            return self._cursor.fetchmany(size)
+        rows = await run_blocking(self._cursor.fetchmany, size)
+        self.drained = len(rows) < size
+        return rows
+
+    async def close(self):
+        await run_blocking(self._cursor.close)
+
+
+def _reset_session_query(variables):
+    return "SET SESSION " + ", ".join(f"{variable} = DEFAULT" for variable in variables)
+
+
+class AsyncConnection:
+    def __init__(self, connection, name, readonly=False):
+        self._connection = connection
+        self._name = name
+        self._readonly = readonly
+        self._cursors = []
+        self._session = []
+
+    def cursor(self, buffered=True):
+        cursor = AsyncCursor(
+            self._connection.cursor(dictionary=True, buffered=buffered), buffered, self._name)
+        self._cursors.append(cursor)
+        return cursor
+
+    async def commit(self):
+        await run_blocking(self._connection.commit)
+        if not self._readonly:
+            # Later reads in this request must see this write
+            _mark_write()
+
+    async def rollback(self):
+        await run_blocking(self._connection.rollback)
+
+    async def set_session(self, variable, value):
+        """SET SESSION `variable` for this borrow; release() puts it back
+        to DEFAULT before the connection is pooled again"""
+        await self.cursor().execute(f"SET SESSION {variable} = %s", (value,))
+        self._session.append(variable)
+
+    def _close_blocking(self):
+        if not all(cursor.drained for cursor in self._cursors):
+            # Rows left unread (e.g. an export cut short): closing the
+            # connection is cheaper than reading them all
+            self._connection.discard()
+            return
+        try:
+            for cursor in self._cursors:
+                cursor._cursor.close()
+            if self._session:
+                cursor = self._connection.cursor()
+                try:
+                    cursor.execute(_reset_session_query(self._session))
+                finally:
+                    cursor.close()
+        except Error:
+            self._connection.discard()
+            return
+        self._connection.close()
+
+    async def release(self):
+        await run_blocking(self._close_blocking)
+
+
+# Native async mode (ASGI): aiomysql pools on the server's event loop.
+# The wrappers below mirror AsyncCursor / AsyncConnection, and driver
+# errors are re-raised as mysql.connector errors so models keep catching
+# the one `Error` type.
+
+def _driver_error(e):
+    errno = e.args[0] if e.args and isinstance(e.args[0], int) else None
+    msg = e.args[1] if len(e.args) > 1 else str(e)
+    if errno is None:
+        return errors.DatabaseError(msg=msg)
+    # Same subclass mysql.connector raises for this error number
+    return errors.get_mysql_exception(errno, msg)
+
+
+class NativeCursor:
+    """AsyncCursor API over an aiomysql cursor"""
+
+    def __init__(self, cursor, buffered, name):
+        self._cursor = cursor
+        self._buffered = buffered
+        self._name = name
+        self.drained = True
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def _call(self, method, *args):
+        try:
+            return await method(*args)
+        except _native.driver_errors as e:
+            raise _driver_error(e) from e
+
+    async def execute(self, query, params=()):
+        self.drained = self._buffered
+        with metrics.db_query_duration_seconds.time(self._name):
+            # No params means no %-substitution, as with mysql.connector
+            await self._call(self._cursor.execute, query, params or None)
+
+    async def executemany(self, query, seq_params):
+        with metrics.db_query_duration_seconds.time(self._name):
+            await self._call(self._cursor.executemany, query, seq_params)
+
+    async def fetchone(self):
+        row = await self._call(self._cursor.fetchone)
+        self.drained = self.drained or row is None
+        return row
+
+    async def fetchall(self):
+        rows = list(await self._call(self._cursor.fetchall))
+        self.drained = True
+        return rows
+
+    async def fetchmany(self, size):
+        rows = list(await self._call(self._cursor.fetchmany, size))
+        self.drained = self.drained or len(rows) < size
+        return rows
+
+    async def close(self):
+        await self._call(self._cursor.close)
+
+
+class NativeConnection:
+    """AsyncConnection API over a connection borrowed from an aiomysql pool"""
+
+    def __init__(self, pool, connection, name, readonly=False):
+        self._pool = pool
+        self._connection = connection
+        self._name = name
+        self._readonly = readonly
+        self._cursors = []
+        self._session = []
+
+    def cursor(self, buffered=True):
+        cursor_class = _native.dict_cursor if buffered else _native.ss_dict_cursor
+        cursor = NativeCursor(self._connection.cursor(cursor_class), buffered, self._name)
+        self._cursors.append(cursor)
+        return cursor
+
+    async def commit(self):
+        try:
+            await self._connection.commit()
+        except _native.driver_errors as e:
+            raise _driver_error(e) from e
+        if not self._readonly:
+            _mark_write()
+
+    async def rollback(self):
+        try:
+            await self._connection.rollback()
+        except _native.driver_errors as e:
+            raise _driver_error(e) from e
+
+    async def set_session(self, variable, value):
+        await self.cursor().execute(f"SET SESSION {variable} = %s", (value,))
+        self._session.append(variable)
+
+    async def _discard(self):
+        self._connection.close()
+        self._pool.release(self._connection)
+        # aiomysql only wakes acquire() waiters for a connection it keeps;
+        # without this they sit out DB_POOL_TIMEOUT for the freed slot
+        await self._pool._wakeup()
+
+    async def release(self):
+        if not all(cursor.drained for cursor in self._cursors):
+            # Closing an SSCursor would read every remaining row
+            await self._discard()
+            return
+        try:
+            for cursor in self._cursors:
+                await cursor._cursor.close()
+            if self._session:
+                async with self._connection.cursor() as cursor:
+                    await cursor.execute(_reset_session_query(self._session))
+            # aiomysql closes a connection handed back mid-transaction;
+            # end it here so the connection stays pooled
+            if not self._connection.closed and self._connection.get_transaction_status():
+                await self._connection.rollback()
+        except _native.driver_errors:
+            await self._discard()
+            return
+        self._pool.release(self._connection)
+
+
+class NativePools:
+    """aiomysql pools for the primary and each replica. Replica choice
+    (health and lag) still comes from the ReplicaSet, whose checks run on
+    the executor."""
+
+    def __init__(self, aiomysql, pymysql, primary, replicas):
+        self.dict_cursor = aiomysql.DictCursor
+        self.ss_dict_cursor = aiomysql.SSDictCursor
+        self.driver_errors = (pymysql.MySQLError,)
+        self.primary = primary
+        self.replicas = replicas
+
+    @classmethod
+    async def open(cls):
+        import aiomysql
+        import pymysql
+        from pymysql.constants import CLIENT
+
+        async def make_pool(host, port=3306):
+            return await aiomysql.create_pool(
+                minsize=0,
+                maxsize=settings.DB_ASYNC_POOL_SIZE,
+                pool_recycle=int(settings.DB_POOL_MAX_IDLE),
+                host=host,
+                port=port,
+                user=settings.DB_USER,
+                password=settings.DB_PASSWORD,
+                db=settings.DB_NAME,
+                autocommit=False,
+                # Same rowcount semantics as the mysql.connector pools
+                client_flag=CLIENT.FOUND_ROWS,
+            )
+
+        replicas = {}
+        if get_replicas() is not None:
+            for replica in get_replicas().replicas:
+                replicas[replica.label] = await make_pool(replica.host, replica.port)
+        return cls(aiomysql, pymysql, await make_pool(settings.DB_HOST), replicas)
+
+    async def _acquire(self, pool):
+        try:
+            return await asyncio.wait_for(pool.acquire(), settings.DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(
+                f"Timed out after {settings.DB_POOL_TIMEOUT}s waiting for a database connection")
+
+    async def acquire(self, name, readonly, use_replica):
+        if use_replica and self.replicas:
+            # Same fallback as ReplicaSet.get_connection: next replica, then
+            # the primary
+            tried = set()
+            while True:
+                replica = await run_blocking(get_replicas().choose, tried)
+                if replica is None:
+                    break
+                tried.add(replica)
+                pool = self.replicas[replica.label]
+                if pool.freesize == 0 and pool.size >= pool.maxsize:
+                    continue  # busy: as ReplicaSet does, never wait on a replica
+                try:
+                    return NativeConnection(pool, await self._acquire(pool), name, readonly)
+                except PoolTimeout:
+                    continue  # busy, not broken: try the next one
+                except self.driver_errors as e:
+                    replica.mark_down(settings.DB_REPLICA_RETRY_AFTER)
+                    logger.warning("replica %s failed over: %s", replica.label, e)
+        try:
+            conn = await self._acquire(self.primary)
+        except self.driver_errors as e:
+            raise _driver_error(e) from e
+        return NativeConnection(self.primary, conn, name, readonly)
+
+    def stats(self):
+        pools = [("primary", self.primary)] + list(self.replicas.items())
+        return [{"pool": label, "size": pool.size, "idle": pool.freesize,
+                 "max": pool.maxsize} for label, pool in pools]
+
+    async def close(self):
+        for pool in [self.primary, *self.replicas.values()]:
+            pool.close()
+            await pool.wait_closed()
+
+
+_native = None
+
+
+async def open_native_pools():
+    """Serve connection() from aiomysql pools on the running event loop.
+    Called once at ASGI startup; WSGI workers never call it."""
+    global _native
+    if _native is None:
+        _native = await NativePools.open()
+    return _native
+
+
+async def close_native_pools():
+    global _native
+    if _native is not None:
+        pools, _native = _native, None
+        await pools.close()
+
+
+def get_native_pool_stats():
+    return _native.stats() if _native is not None else []
+
+
+@asynccontextmanager
+async def connection(name="query", readonly=False):
+    """Borrow a pooled connection for the duration of an async block;
+    statements run on it are timed under `name`. readonly=True routes to
+    a replica when one is configured and healthy."""
+    # Checked here: executor threads do not see the request's context
+    use_replica = readonly and not _wrote_in_request()
+    with metrics.db_connection_acquire_seconds.time():
+        if _native is not None:
+            wrapper = await _native.acquire(name, readonly, use_replica)
+        else:
+            db = await run_blocking(get_read_connection if use_replica else get_db_connection)
+            wrapper = AsyncConnection(db, name, readonly)
     try:
-        return mysql.connector.connect(
-            host=settings.DB_HOST,
-            user=settings.DB_USER,
-            passwd=settings.DB_PASSWORD,
-            database=settings.DB_NAME
-        )
-    except Error as e:
-        raise e
+        yield wrapper
+    finally:
+        await wrapper.release()
@@ -0,0 +1,27 @@
+class HTTPException(Exception):
+    """Error with an HTTP status for the routers to report.
+
+    str() gives "<status_code>: <detail>", the format API clients already
+    see in error messages.
+    """
+
+    def __init__(self, status_code: int, detail: str = None):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(status_code, detail)
+
+    def __str__(self):
+        return f"{self.status_code}: {self.detail}"
+
+    def __repr__(self):
+        return f"{type(self).__name__}(status_code={self.status_code!r}, detail={self.detail!r})"
+
+
+def caused_by(e, types):
+    """True when `e` or an error it was raised from is one of `types`;
+    models re-raise driver errors, so look down the chain too"""
+    while e is not None:
+        if isinstance(e, types):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
@@ -0,0 +1,44 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+_local = threading.local()
+
+
+def get_event_loop():
+    """Long-lived event loop owned by the current worker thread"""
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+    return loop
+
+
+def run_async(coro):
+    """Run a coroutine to completion from sync (WSGI) code"""
+    return get_event_loop().run_until_complete(coro)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared executor without stalling the loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs))
+
+
+def iterate_async(agen):
+    """Drive an async generator from a sync (WSGI streaming) generator"""
+    loop = get_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(agen.aclose())
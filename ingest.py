@@ -0,0 +1,310 @@
+"""Write-behind ingestion for POST /users/?async=1.
+
+A validated submission is appended to a local SQLite queue (WAL,
+synchronous=FULL) and acknowledged with 202 and a tracking id once that
+commit is on disk. A flusher thread in each worker claims pending
+entries every INGEST_FLUSH_INTERVAL and group-commits them into MySQL
+through UserModel.create_users_bulk, which records a receipt per
+tracking id in the same transaction.
+
+Nothing is lost when a worker dies. An entry stays pending until it is
+marked done or failed. A dead worker's claims expire after
+INGEST_CLAIM_TIMEOUT. A batch retried after MySQL committed it finds its
+receipts instead of inserting the users twice. A batch MySQL rejects is
+split until the offending entry is isolated; that entry alone is retried
+and, after INGEST_MAX_ATTEMPTS, marked failed.
+
+All workers on a host share the queue file, so a tracking id can be
+looked up on the host that accepted it. `flask ingest-flush` drains the
+queue by hand.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from mysql.connector import errors
+
+import metrics
+from config import settings
+from exceptions import caused_by
+from executor import run_async
+
+logger = logging.getLogger(__name__)
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    tracking_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    user_id INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_state ON submissions (state, created_at);
+'''
+
+
+class IngestQueue:
+    def __init__(self, path):
+        self.path = path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        """This thread's connection; autocommit, explicit BEGIN where needed"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            # fsync on every commit: an acknowledged submission is on disk
+            db.execute("PRAGMA synchronous=FULL")
+            self._local.db = db
+        return db
+
+    def append(self, payload: str):
+        """Store a submission; returns its tracking id once durable"""
+        tracking_id = uuid.uuid4().hex
+        now = time.time()
+        self._db().execute(
+            "INSERT INTO submissions (tracking_id, payload, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?)", (tracking_id, payload, now, now))
+        return tracking_id
+
+    def status(self, tracking_id: str):
+        row = self._db().execute(
+            "SELECT tracking_id, state, user_id, error, created_at, updated_at "
+            "FROM submissions WHERE tracking_id = ?", (tracking_id,)).fetchone()
+        if row is None:
+            return None
+        status = dict(row)
+        status['created_at'] = datetime.fromtimestamp(status['created_at'])
+        status['updated_at'] = datetime.fromtimestamp(status['updated_at'])
+        return status
+
+    def pending_count(self):
+        return self._db().execute(
+            "SELECT COUNT(*) FROM submissions WHERE state = ?", (PENDING,)).fetchone()[0]
+
+    def claim(self, limit: int, claim_timeout: float):
+        """[(tracking_id, payload, attempts)] of up to `limit` pending
+        entries, oldest first, now claimed by this worker; attempts counts
+        this claim"""
+        db = self._db()
+        now = time.time()
+        stale = now - claim_timeout
+        # Cheap read first; the write lock only when there is work
+        if db.execute(
+                "SELECT 1 FROM submissions WHERE state = ? "
+                "AND (claimed_at IS NULL OR claimed_at < ?) LIMIT 1",
+                (PENDING, stale)).fetchone() is None:
+            return []
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT tracking_id, payload, attempts FROM submissions WHERE state = ? "
+                "AND (claimed_at IS NULL OR claimed_at < ?) ORDER BY created_at LIMIT ?",
+                (PENDING, stale, limit)).fetchall()
+            db.executemany(
+                "UPDATE submissions SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1 "
+                "WHERE tracking_id = ?", [(self.owner, now, row[0]) for row in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return [(row[0], row[1], row[2] + 1) for row in rows]
+
+    def complete(self, outcomes: dict):
+        """Record {tracking_id: outcome} from create_users_bulk"""
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for tracking_id, outcome in outcomes.items():
+                if outcome['status'] == "success":
+                    state, user_id, error = DONE, outcome['id'], None
+                else:
+                    state, user_id, error = FAILED, None, outcome['message']
+                db.execute(
+                    "UPDATE submissions SET state = ?, user_id = ?, error = ?, "
+                    "claimed_by = NULL, claimed_at = NULL, updated_at = ? WHERE tracking_id = ?",
+                    (state, user_id, error, now, tracking_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def retry_later(self, tracking_ids: list, delay: float, claim_timeout: float):
+        """Let claimed entries be claimed again after `delay` seconds"""
+        claimed_at = time.time() - claim_timeout + delay
+        self._db().executemany(
+            "UPDATE submissions SET claimed_at = ? WHERE tracking_id = ?",
+            [(claimed_at, tracking_id) for tracking_id in tracking_ids])
+
+    def purge(self, older_than: float):
+        """Forget finished entries last updated more than `older_than` seconds ago"""
+        return self._db().execute(
+            "DELETE FROM submissions WHERE state <> ? AND updated_at < ?",
+            (PENDING, time.time() - older_than)).rowcount
+
+
+# asgi.py sets its server loop here: the flusher thread then runs MySQL
+# work there, where the native pools live, instead of on its own loop
+_event_loop = None
+
+
+def use_event_loop(loop):
+    global _event_loop
+    _event_loop = loop
+
+
+def _run(coro):
+    if _event_loop is not None:
+        return asyncio.run_coroutine_threadsafe(coro, _event_loop).result()
+    return run_async(coro)
+
+
+def _database_unavailable(e):
+    """True for errors about reaching MySQL (no pooled connection, lost or
+    refused connection) rather than about the rows sent"""
+    return caused_by(e, (errors.PoolError, errors.InterfaceError, errors.OperationalError))
+
+
+def _commit(items, outcomes, rejected):
+    """create_users_bulk over `items`, filling `outcomes`. A batch MySQL
+    rejects is split in halves until each refused entry is alone; those
+    go to `rejected` with the error. Raises when MySQL is unreachable."""
+    from models.user import UserModel
+
+    try:
+        results = _run(UserModel.create_users_bulk(items, receipts=True))
+    except Exception as e:
+        if _database_unavailable(e):
+            raise
+        if len(items) == 1:
+            rejected[items[0][0]] = str(e)
+            return
+        middle = len(items) // 2
+        _commit(items[:middle], outcomes, rejected)
+        _commit(items[middle:], outcomes, rejected)
+        return
+    for outcome in results:
+        outcomes[outcome['index']] = outcome
+
+
+def flush_batch(queue: IngestQueue, batch_size: int):
+    """Claim one batch and commit it to MySQL; returns the number claimed.
+
+    An entry MySQL keeps refusing is retried after INGEST_RETRY_AFTER and
+    marked failed on its INGEST_MAX_ATTEMPTS-th claim, so it cannot hold
+    up the entries behind it. When MySQL is unreachable the batch goes
+    back to the queue and it raises."""
+    from schemas.user import UserCreate
+
+    claimed = queue.claim(batch_size, settings.INGEST_CLAIM_TIMEOUT)
+    if not claimed:
+        return 0
+
+    outcomes = {}
+    rejected = {}
+    items = []
+    for tracking_id, payload, _ in claimed:
+        try:
+            items.append((tracking_id, UserCreate.model_validate_json(payload).model_dump()))
+        except ValueError as e:
+            outcomes[tracking_id] = {"status": "error", "message": str(e)}
+
+    started = time.perf_counter()
+    try:
+        if items:
+            _commit(items, outcomes, rejected)
+    except Exception:
+        # Receipts make a retry of anything already committed harmless
+        queue.retry_later([tracking_id for tracking_id, _, _ in claimed],
+                          settings.INGEST_RETRY_AFTER, settings.INGEST_CLAIM_TIMEOUT)
+        raise
+    metrics.ingest_flush_seconds.observe(time.perf_counter() - started)
+
+    retry = []
+    for tracking_id, _, attempts in claimed:
+        if tracking_id not in rejected:
+            continue
+        if attempts >= settings.INGEST_MAX_ATTEMPTS:
+            outcomes[tracking_id] = {"status": "error", "message": rejected[tracking_id]}
+        else:
+            retry.append(tracking_id)
+    if retry:
+        logger.warning("ingest: %d entries rejected by MySQL, retrying in %ss",
+                       len(retry), settings.INGEST_RETRY_AFTER)
+        queue.retry_later(retry, settings.INGEST_RETRY_AFTER, settings.INGEST_CLAIM_TIMEOUT)
+
+    queue.complete(outcomes)
+    for outcome in outcomes.values():
+        metrics.ingest_flushed_total.inc(DONE if outcome['status'] == "success" else FAILED)
+    return len(claimed)
+
+
+class Flusher(threading.Thread):
+    """Background group commit for one worker"""
+
+    def __init__(self, queue: IngestQueue):
+        super().__init__(name="ingest-flusher", daemon=True)
+        self.queue = queue
+        self._last_purge = 0.0
+
+    def run(self):
+        while True:
+            time.sleep(settings.INGEST_FLUSH_INTERVAL)
+            try:
+                # Full batches mean a backlog: keep going without sleeping
+                while flush_batch(self.queue, settings.INGEST_BATCH_SIZE) == settings.INGEST_BATCH_SIZE:
+                    pass
+                if time.monotonic() - self._last_purge > 3600:
+                    self.queue.purge(settings.INGEST_RETENTION_HOURS * 3600)
+                    self._last_purge = time.monotonic()
+            except Exception:
+                logger.exception("ingest flush failed; retrying in %ss", settings.INGEST_RETRY_AFTER)
+                time.sleep(settings.INGEST_RETRY_AFTER)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue():
+    """This worker's queue handle; its flusher starts with it"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                queue = IngestQueue(settings.INGEST_QUEUE_PATH)
+                Flusher(queue).start()
+                _queue = queue
+    return _queue
+
+
+def resume():
+    """At worker start: pick up entries an earlier process left pending"""
+    if os.path.exists(settings.INGEST_QUEUE_PATH):
+        get_ingest_queue()
+
+
+def _collect_ingest_metrics():
+    if _queue is not None:
+        metrics.ingest_pending.set(value=_queue.pending_count())
+
+
+metrics.registry.add_collector(_collect_ingest_metrics)
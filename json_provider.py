@@ -0,0 +1,62 @@
+"""orjson-backed JSON provider for the Flask app.
+
+Rows from mysql.connector (datetime, date, Decimal) are encoded directly,
+so routers can hand query results to jsonify without copying them into
+models first. Without orjson installed this is Flask's default provider.
+dumps_bytes() gives the ASGI app the same encoding.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _orjson_options(datetime_format, sort_keys=False):
+    option = orjson.OPT_NON_STR_KEYS
+    if datetime_format == "http":
+        # hand datetimes to the default hook, i.e. Flask's http_date
+        option |= orjson.OPT_PASSTHROUGH_DATETIME
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return option
+
+
+def dumps_bytes(obj, datetime_format="http"):
+    """Response body bytes, encoded exactly as FastJSONProvider.response()"""
+    if orjson is None:
+        return (json.dumps(obj, default=_default, separators=(",", ":")) + "\n").encode()
+    return orjson.dumps(obj, default=_default,
+                        option=_orjson_options(datetime_format) | orjson.OPT_APPEND_NEWLINE)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # "http" keeps Flask's RFC 822 dates on the wire; "iso" lets orjson
+    # write ISO 8601 itself, which is the faster path
+    datetime_format = "http"
+    sort_keys = False
+
+    def _options(self):
+        return _orjson_options(self.datetime_format, self.sort_keys)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {"separators"}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # Bytes straight into the response, no str round trip
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,169 @@
+"""Minimal in-process Prometheus metrics (text exposition format 0.0.4).
+
+Each worker process keeps its own values; scrape every worker, or sum
+them at the collector.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2]))
+                     for labels, state in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() is called at scrape time to refresh gauges"""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status",
+    ("route", "method", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent in the request handler",
+    ("route", "method")))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"))
+db_query_duration_seconds = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency by query name",
+    ("query",)))
+db_connection_acquire_seconds = registry.register(Histogram(
+    "db_connection_acquire_seconds", "Time to borrow a pooled connection"))
+stage_duration_seconds = registry.register(Histogram(
+    "stage_duration_seconds", "Time spent in named request stages (validation, encoding)",
+    ("stage",)))
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections", "Pool connections by state", ("state",)))
+db_replica_lag_seconds = registry.register(Gauge(
+    "db_replica_lag_seconds", "Last measured replication lag", ("replica",)))
+db_replica_healthy = registry.register(Gauge(
+    "db_replica_healthy", "1 if the replica is taking reads", ("replica",)))
+admission_active = registry.register(Gauge(
+    "admission_active", "Requests admitted and in progress (see admission.py)"))
+admission_queue_depth = registry.register(Gauge(
+    "admission_queue_depth", "Requests waiting for admission", ("priority",)))
+admission_rejected_total = registry.register(Counter(
+    "admission_rejected_total", "Requests shed with 503", ("priority", "reason")))
+admission_wait_seconds = registry.register(Histogram(
+    "admission_wait_seconds", "Time queued requests waited for admission"))
+ingest_pending = registry.register(Gauge(
+    "ingest_pending", "Queued user submissions not yet in MySQL (see ingest.py)"))
+ingest_flushed_total = registry.register(Counter(
+    "ingest_flushed_total", "Queued user submissions flushed, by outcome", ("state",)))
+ingest_flush_seconds = registry.register(Histogram(
+    "ingest_flush_seconds", "Time to group-commit one ingestion batch"))
@@ -0,0 +1,107 @@
+"""Versioned schema migrations.
+
+migrations/NNN_description.sql files are applied in version order, and
+each applied version is recorded in schema_migrations with a checksum of
+the file. MySQL commits DDL implicitly, so a migration that fails halfway
+is not rolled back: fix the cause, undo the statements that did run, and
+migrate again.
+"""
+import glob
+import hashlib
+import os
+import re
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(ROOT, "migrations")
+
+SCHEMA_MIGRATIONS_DDL = '''
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+
+class Migration:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        match = re.match(r"(\d+)_", self.name)
+        if not match:
+            raise ValueError(f"Migration file name must start with a version: {self.name}")
+        self.version = int(match.group(1))
+        with open(path) as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+
+    def statements(self):
+        return split_sql(self.sql)
+
+
+def split_sql(text):
+    """Statements of a DDL file; comments dropped, split on ';'"""
+    lines = [line for line in text.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = [Migration(path) for path in sorted(glob.glob(os.path.join(directory, "*.sql")))]
+    versions = [m.version for m in migrations]
+    duplicates = sorted({v for v in versions if versions.count(v) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate migration versions: {duplicates}")
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def applied_migrations(cursor):
+    """{version: checksum} of what this database already has"""
+    cursor.execute(SCHEMA_MIGRATIONS_DDL)
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def status(cursor, directory=MIGRATIONS_DIR):
+    """[(migration, state)] with state "applied", "pending" or "modified"
+    (applied, but the file changed since)"""
+    applied = applied_migrations(cursor)
+    report = []
+    for migration in load_migrations(directory):
+        if migration.version not in applied:
+            state = "pending"
+        elif applied[migration.version] != migration.checksum:
+            state = "modified"
+        else:
+            state = "applied"
+        report.append((migration, state))
+    return report
+
+
+def migrate(db, target=None, fake=False, echo=print, directory=MIGRATIONS_DIR):
+    """Apply pending migrations up to `target` (default: all); returns
+    the migrations applied. With fake=True they are only recorded, for a
+    database whose schema was created by hand."""
+    cursor = db.cursor()
+    try:
+        applied = applied_migrations(cursor)
+        done = []
+        for migration in load_migrations(directory):
+            if migration.version in applied:
+                continue
+            if target is not None and migration.version > target:
+                break
+            if not fake:
+                echo(f"applying {migration.name}")
+                for statement in migration.statements():
+                    cursor.execute(statement)
+            else:
+                echo(f"recording {migration.name} as applied")
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum))
+            db.commit()
+            done.append(migration)
+        return done
+    finally:
+        cursor.close()
@@ -13,6 +13,7 @@ CREATE TABLE users (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     name VARCHAR(255) NOT NULL,
     no_hp VARCHAR(20),
+    prodi VARCHAR(255),
     take_date DATE,
     image TEXT,
     result_id BIGINT,
@@ -0,0 +1,13 @@
+-- Indexed search for GET /users?search=
+-- Requires MySQL 8.0+ (ngram parser, REGEXP_REPLACE in generated columns)
+
+-- Digits-only copy of no_hp with the +62 country code folded to a leading 0,
+-- so "0812-345", "+62812345" and "62812345" all share one prefix
+ALTER TABLE users
+    ADD COLUMN no_hp_digits VARCHAR(20)
+        AS (REGEXP_REPLACE(REGEXP_REPLACE(no_hp, '[^0-9]', ''), '^62', '0')) STORED;
+
+CREATE INDEX idx_users_no_hp_digits ON users(no_hp_digits);
+
+-- ngram tokens so substrings of names and study programs still match
+CREATE FULLTEXT INDEX ft_users_name_prodi ON users(name, prodi) WITH PARSER ngram;
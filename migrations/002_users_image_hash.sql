@@ -0,0 +1,4 @@
+-- User images move to the image store; the row keeps only the sha256 digest.
+-- Existing base64 images are moved by `flask migrate-images`, which clears
+-- users.image once each blob is stored.
+ALTER TABLE users ADD COLUMN image_hash CHAR(64) NULL AFTER image;
@@ -0,0 +1,3 @@
+-- Keyset listing of results: live rows newest first, WHERE deleted_at IS NULL
+-- ORDER BY created_at DESC, id DESC is a backward range scan on this index.
+CREATE INDEX idx_results_deleted_created ON results (deleted_at, created_at, id);
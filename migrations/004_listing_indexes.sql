@@ -0,0 +1,9 @@
+-- Indexes behind the hot users listing queries; `flask db-explain` checks
+-- that the model queries use them.
+
+-- GET /users, offset and keyset: WHERE deleted_at IS NULL
+-- ORDER BY created_at DESC, id DESC reads this index backwards, no filesort
+CREATE INDEX idx_users_deleted_created ON users (deleted_at, created_at, id);
+
+-- from_date / to_date filters on take_date
+CREATE INDEX idx_users_deleted_take_date ON users (deleted_at, take_date);
@@ -0,0 +1,27 @@
+-- Rows soft-deleted more than PURGE_AFTER_DAYS ago are moved here by
+-- `flask purge-deleted`, keeping the live tables and their indexes small.
+-- Primary keys only: archives are read rarely, written in id batches.
+CREATE TABLE results_archive (
+    id BIGINT PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NULL,
+    deleted_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE users_archive (
+    id BIGINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    no_hp VARCHAR(20),
+    prodi VARCHAR(255),
+    take_date DATE,
+    image TEXT,
+    image_hash CHAR(64),
+    result_id BIGINT,
+    created_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NULL,
+    deleted_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
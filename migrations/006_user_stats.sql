@@ -0,0 +1,23 @@
+-- Live user counts per result, prodi and take_date for GET /stats. The
+-- users write paths keep it current; `flask stats-rebuild` recomputes it.
+-- dim_key is the value as text ('' when not set), so each dimension is
+-- one primary key range.
+CREATE TABLE user_stats (
+    dimension VARCHAR(16) NOT NULL,
+    dim_key VARCHAR(255) NOT NULL,
+    user_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, dim_key)
+);
+
+-- Backfill from the existing users
+INSERT INTO user_stats (dimension, dim_key, user_count)
+SELECT 'result', COALESCE(CAST(result_id AS CHAR), ''), COUNT(*)
+FROM users WHERE deleted_at IS NULL GROUP BY result_id;
+
+INSERT INTO user_stats (dimension, dim_key, user_count)
+SELECT 'prodi', COALESCE(prodi, ''), COUNT(*)
+FROM users WHERE deleted_at IS NULL GROUP BY prodi;
+
+INSERT INTO user_stats (dimension, dim_key, user_count)
+SELECT 'take_date', COALESCE(CAST(take_date AS CHAR), ''), COUNT(*)
+FROM users WHERE deleted_at IS NULL GROUP BY take_date;
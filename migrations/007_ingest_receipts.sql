@@ -0,0 +1,11 @@
+-- One row per user created from the write-behind ingestion queue
+-- (ingest.py), written in the same transaction as the users rows. A flush
+-- retried after a crash finds its tracking ids here and does not insert
+-- the users twice. `flask purge-deleted` drops receipts past retention.
+CREATE TABLE ingest_receipts (
+    tracking_id CHAR(32) PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_ingest_receipts_created ON ingest_receipts (created_at);
@@ -0,0 +1,8 @@
+-- Client-generated key for each row of a multi-row INSERT
+-- (UserModel.create_users_bulk). Each row's id is read back by this key
+-- rather than derived from LAST_INSERT_ID() + offset, because a
+-- statement's auto-increment ids need not be consecutive under
+-- innodb_autoinc_lock_mode=2. NULL for users created one at a time.
+ALTER TABLE users ADD COLUMN insert_key CHAR(32) NULL;
+
+CREATE UNIQUE INDEX idx_users_insert_key ON users (insert_key);
@@ -0,0 +1,42 @@
+"""Query building and streaming shared by the models"""
+import re
+
+from database import connection, Error
+from exceptions import HTTPException
+
+
+def prefix_pattern(text: str) -> str:
+    """LIKE pattern for values starting with `text`, wildcards escaped"""
+    return re.sub(r'([\\%_])', r'\\\1', text) + "%"
+
+
+def date_range(column: str, from_date=None, to_date=None):
+    """WHERE terms and params bounding `column` to [from_date, to_date]"""
+    where = ""
+    params = []
+    if from_date:
+        where += f" AND {column} >= %s"
+        params.append(from_date)
+    if to_date:
+        where += f" AND {column} <= %s"
+        params.append(to_date)
+    return where, params
+
+
+async def stream_rows(name: str, query: str, params, fetch_size: int):
+    """Yield the rows of `query` in batches from an unbuffered cursor on a
+    read connection, so memory stays flat however many rows match"""
+    try:
+        async with connection(name, readonly=True) as db:
+            cursor = db.cursor(buffered=False)
+            # A slow client must not trip the server's write timeout;
+            # release() sets it back before the connection is pooled again
+            await db.set_session("net_write_timeout", 3600)
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,94 +1,288 @@
+import time
 from datetime import datetime
-from database import get_db_connection
-from fastapi import HTTPException
-from mysql.connector import Error
+from cache import TTLCache
+from config import settings
+from database import connection, Error
+from exceptions import HTTPException
+from models.common import date_range, prefix_pattern, stream_rows
+from models.user import UserModel
+from pagination import keyset_condition, keyset_order, keyset_page
+
+
+# Results are small and rarely written. A write clears this cache only in
+# the worker that made it; other workers serve the old row until
+# RESULT_CACHE_TTL expires. For DB_REPLICA_MAX_LAG seconds after a local
+# write nothing is cached, so a read from a lagging replica (or one that
+# started before the write) cannot put the old row back.
+_result_cache = TTLCache(maxsize=settings.RESULT_CACHE_SIZE,
+                         ttl=settings.RESULT_CACHE_TTL)
+_last_write = 0.0
+
+
+def _cache_set(key, value):
+    if time.monotonic() - _last_write >= settings.DB_REPLICA_MAX_LAG:
+        _result_cache.set(key, value)
+
+
+RESULT_SELECT = '''
+SELECT id, title, description, created_at, updated_at
+FROM results
+'''
+
+# Read-back inside the write paths
+RESULT_BY_ID_QUERY = RESULT_SELECT + '''
+WHERE id = %s
+'''
+
+LIVE_RESULT_BY_ID_QUERY = RESULT_BY_ID_QUERY + '''AND deleted_at IS NULL
+'''
 
 
 class ResultModel:
     @staticmethod
     async def create_result(result_data: dict):
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
+            async with connection("results.create") as db:
+                cursor = db.cursor()
 
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-            insert_query = '''
-            INSERT INTO results (title, description, created_at, updated_at)
-            VALUES (%s, %s, %s, %s)
-            '''
+                insert_query = '''
+                INSERT INTO results (title, description, created_at, updated_at)
+                VALUES (%s, %s, %s, %s)
+                '''
 
-            values = (
-                result_data['title'],
-                result_data.get('description'),
-                current_time,
-                current_time
-            )
+                values = (
+                    result_data['title'],
+                    result_data.get('description'),
+                    current_time,
+                    current_time
+                )
 
-            cursor.execute(insert_query, values)
-            result_id = cursor.lastrowid
-            db.commit()
-
-            # Fetch the created result
-            return await ResultModel.get_result_by_id(result_id)
+                await cursor.execute(insert_query, values)
+                # Read back inside the same transaction, then commit once
+                await cursor.execute(RESULT_BY_ID_QUERY, (cursor.lastrowid,))
+                result = await cursor.fetchone()
+                await db.commit()
+                ResultModel.invalidate_cache()
 
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        return result
 
     @staticmethod
     async def get_result_by_id(result_id: int):
+        cache_key = ('id', result_id)
+        result = _result_cache.get(cache_key)
+        if result is not None:
+            return result
+
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
+            async with connection("results.get_by_id", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(LIVE_RESULT_BY_ID_QUERY, (result_id,))
+                result = await cursor.fetchone()
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            select_query = '''
-            SELECT id, title, description, created_at, updated_at
-            FROM results
-            WHERE id = %s
-            '''
+        if not result:
+            raise HTTPException(status_code=404, detail="Result not found")
 
-            cursor.execute(select_query, (result_id,))
-            result = cursor.fetchone()
+        _cache_set(cache_key, result)
+        return result
 
-            if not result:
-                raise HTTPException(status_code=404, detail="Result not found")
+    @staticmethod
+    def ids_query(ids: list):
+        placeholders = ", ".join(["%s"] * len(ids))
+        return RESULT_SELECT + f"WHERE id IN ({placeholders}) AND deleted_at IS NULL", list(ids)
 
-            return result
+    @staticmethod
+    async def get_results_by_ids(ids: list):
+        """{id: row} for the ids that exist; cache hits are served as-is
+        and the rest are read with one IN query"""
+        found = {}
+        for result_id in ids:
+            result = _result_cache.get(('id', result_id))
+            if result is not None:
+                found[result_id] = result
+        pending = [result_id for result_id in ids if result_id not in found]
+        if not pending:
+            return found
 
+        try:
+            async with connection("results.get_by_ids", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(*ResultModel.ids_query(pending))
+                rows = await cursor.fetchall()
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        for result in rows:
+            _cache_set(('id', result['id']), result)
+            found[result['id']] = result
+        return found
+
+    @staticmethod
+    def _build_filters(include_deleted: bool, search: str = None,
+                       from_date: datetime = None, to_date: datetime = None):
+        """WHERE clause and params shared by the listing queries"""
+        where = " WHERE 1=1"
+        params = []
+
+        if not include_deleted:
+            where += " AND deleted_at IS NULL"
+
+        search = search.strip() if search else None
+        if search:
+            # Title prefix; the catalogue is small enough not to need FULLTEXT
+            where += " AND title LIKE %s"
+            params.append(prefix_pattern(search))
+
+        dates, date_params = date_range("created_at", from_date, to_date)
+        return where + dates, params + date_params
 
     @staticmethod
-    async def get_all_results():
+    def cursor_query(cursor_token: str, limit: int, include_deleted: bool = False,
+                     search: str = None, from_date: datetime = None,
+                     to_date: datetime = None):
+        """SQL, params and direction for one keyset page (limit + 1 rows)"""
+        where, params = ResultModel._build_filters(
+            include_deleted, search, from_date, to_date)
+
+        keyset, keyset_params, direction = keyset_condition(cursor_token, "created_at", "id")
+        where += keyset
+        params += keyset_params
+
+        order = keyset_order(direction)
+        query = RESULT_SELECT + where + \
+            f" ORDER BY created_at {order}, id {order} LIMIT %s"
+        return query, params + [limit + 1], direction
+
+    @staticmethod
+    def export_query(include_deleted: bool = False, search: str = None,
+                     from_date: datetime = None, to_date: datetime = None):
+        where, params = ResultModel._build_filters(
+            include_deleted, search, from_date, to_date)
+        return RESULT_SELECT + where + " ORDER BY created_at DESC, id DESC", params
+
+    @staticmethod
+    async def get_results_by_cursor(cursor_token: str, limit: int, include_deleted: bool = False,
+                                    search: str = None, from_date: datetime = None,
+                                    to_date: datetime = None):
+        """Keyset page on (created_at, id), newest first.
+        Returns (results, next_cursor, prev_cursor)."""
+        cache_key = ('page', cursor_token or None, limit, bool(include_deleted),
+                     search.strip().lower() if search and search.strip() else None,
+                     from_date.isoformat() if from_date else None,
+                     to_date.isoformat() if to_date else None)
+        page = _result_cache.get(cache_key)
+        if page is not None:
+            return page
+
+        select_query, params, direction = ResultModel.cursor_query(
+            cursor_token, limit, include_deleted, search, from_date, to_date)
+
+        try:
+            async with connection("results.page_by_cursor", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(select_query, params)
+                results = await cursor.fetchall()
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        page = keyset_page(results, limit, direction, cursor_token)
+        _cache_set(cache_key, page)
+        return page
+
+    @staticmethod
+    def stream_results(include_deleted: bool = False, search: str = None,
+                       from_date: datetime = None, to_date: datetime = None,
+                       fetch_size: int = 1000):
+        """Batches of every matching result; see stream_rows"""
+        select_query, params = ResultModel.export_query(
+            include_deleted, search, from_date, to_date)
+        return stream_rows("results.export", select_query, params, fetch_size)
+
+    @staticmethod
+    async def update_result(result_id: int, result_data: dict):
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
+            async with connection("results.update") as db:
+                cursor = db.cursor()
+
+                update_parts = []
+                values = []
+
+                if 'title' in result_data:
+                    update_parts.append("title = %s")
+                    values.append(result_data['title'])
+
+                if 'description' in result_data:
+                    update_parts.append("description = %s")
+                    values.append(result_data['description'])
 
-            select_query = '''
-            SELECT id, title, description, created_at, updated_at
-            FROM results
-            ORDER BY created_at DESC
-            '''
+                update_parts.append("updated_at = %s")
+                values.append(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                values.append(result_id)
 
-            cursor.execute(select_query)
-            results = cursor.fetchall()
+                update_query = f'''
+                UPDATE results
+                SET {', '.join(update_parts)}
+                WHERE id = %s AND deleted_at IS NULL
+                '''
 
-            return results
+                await cursor.execute(update_query, values)
+                if cursor.rowcount == 0:
+                    raise HTTPException(
+                        status_code=404, detail="Result not found or already deleted")
+
+                await cursor.execute(RESULT_BY_ID_QUERY, (result_id,))
+                result = await cursor.fetchone()
+                await db.commit()
+                ResultModel.invalidate_cache()
+
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return result
+
+    @staticmethod
+    async def delete_result(result_id: int):
+        """Soft-delete a result, then its users in committed batches.
+
+        Listings already hide users of a deleted result through the join,
+        so the result goes first; if the cascade is cut short,
+        `flask purge-deleted` finishes it.
+        """
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            async with connection("results.delete") as db:
+                cursor = db.cursor()
+                await cursor.execute('''
+                UPDATE results
+                SET deleted_at = %s
+                WHERE id = %s AND deleted_at IS NULL
+                ''', (current_time, result_id))
+                await db.commit()
+                deleted = cursor.rowcount
+                if deleted:
+                    ResultModel.invalidate_cache()
+                    UserModel.invalidate_counts()
+
+            if deleted == 0:
+                raise HTTPException(
+                    status_code=404, detail="Result not found or already deleted")
+
+            users_deleted = await UserModel.delete_users_of_result(
+                result_id, current_time, settings.RESULT_DELETE_BATCH_SIZE)
 
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        return {"id": result_id, "users_deleted": users_deleted}
+
+    @staticmethod
+    def invalidate_cache():
+        global _last_write
+        _last_write = time.monotonic()
+        _result_cache.invalidate()
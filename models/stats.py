@@ -0,0 +1,129 @@
+from collections import Counter
+from datetime import date, datetime
+from database import connection, Error
+from exceptions import HTTPException
+
+
+# Live (not soft-deleted) users per result, prodi and take_date, kept in
+# user_stats by every write path in the same transaction as the write.
+# Keys are strings; '' stands for "not set".
+DIMENSIONS = {
+    "result": "result_id",
+    "prodi": "prodi",
+    "take_date": "take_date",
+}
+
+
+def _key(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class StatsModel:
+    @staticmethod
+    def rows_delta_query(where: str, sign: int):
+        """INSERT adding `sign` per users row matching `where` to every
+        dimension, in primary key order like deltas_query; execute it with
+        the WHERE params repeated once per dimension (see rows_delta_params)"""
+        selects = " UNION ALL ".join(
+            f"SELECT '{dimension}' AS dimension, COALESCE(CAST({column} AS CHAR), '') AS dim_key, "
+            f"{int(sign)} * COUNT(*) AS delta FROM users WHERE {where} GROUP BY {column}"
+            for dimension, column in DIMENSIONS.items()
+        )
+        return f'''
+        INSERT INTO user_stats (dimension, dim_key, user_count)
+        SELECT d.dimension, d.dim_key, d.delta FROM ({selects}) AS d
+        ORDER BY d.dimension, d.dim_key
+        ON DUPLICATE KEY UPDATE user_count = user_stats.user_count + d.delta
+        '''
+
+    @staticmethod
+    def rows_delta_params(params):
+        return list(params) * len(DIMENSIONS)
+
+    @staticmethod
+    async def apply_rows(cursor, where: str, params, sign: int):
+        """Count matching users rows in (sign=1) or out (sign=-1); callers
+        hold the row locks, i.e. run it right after their own write"""
+        await cursor.execute(StatsModel.rows_delta_query(where, sign),
+                             StatsModel.rows_delta_params(params))
+
+    @staticmethod
+    def row_deltas(old: dict = None, new: dict = None):
+        """Counter of (dimension, key) -> change for one row moving from
+        `old` to `new` (either may be None)"""
+        deltas = Counter()
+        for dimension, column in DIMENSIONS.items():
+            if old is not None:
+                deltas[(dimension, _key(old[column]))] -= 1
+            if new is not None:
+                deltas[(dimension, _key(new[column]))] += 1
+        return {key: delta for key, delta in deltas.items() if delta}
+
+    @staticmethod
+    def deltas_query(deltas: dict):
+        """Upsert of `deltas` in primary key order: concurrent writers lock
+        the same user_stats rows in the same order and cannot deadlock"""
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(deltas))
+        params = []
+        for (dimension, key), delta in sorted(deltas.items()):
+            params.extend([dimension, key, delta])
+        return f'''
+        INSERT INTO user_stats (dimension, dim_key, user_count)
+        VALUES {placeholders} AS new
+        ON DUPLICATE KEY UPDATE user_count = user_stats.user_count + new.user_count
+        ''', params
+
+    @staticmethod
+    async def apply_deltas(cursor, deltas: dict):
+        if not deltas:
+            return
+        await cursor.execute(*StatsModel.deltas_query(deltas))
+
+    @staticmethod
+    def rebuild_queries():
+        """Statements recomputing user_stats from users, in one transaction"""
+        return [
+            ("DELETE FROM user_stats", []),
+            (StatsModel.rows_delta_query("deleted_at IS NULL", 1),
+             StatsModel.rows_delta_params([])),
+        ]
+
+    @staticmethod
+    def dimension_query(dimension: str, from_key: str = None, to_key: str = None):
+        """One primary key range read of user_stats"""
+        query = '''
+        SELECT dim_key, user_count FROM user_stats
+        WHERE dimension = %s AND user_count <> 0
+        '''
+        params = [dimension]
+        if from_key:
+            query += " AND dim_key >= %s"
+            params.append(from_key)
+        if to_key:
+            query += " AND dim_key <= %s"
+            params.append(to_key)
+        return query + " ORDER BY dim_key", params
+
+    @staticmethod
+    async def get_stats(from_date: datetime = None, to_date: datetime = None):
+        """{dimension: [(key, count)]}; the date range applies to take_date"""
+        ranges = {"take_date": (_key(from_date) or None, _key(to_date) or None)}
+        stats = {}
+        try:
+            async with connection("stats.get", readonly=True) as db:
+                cursor = db.cursor()
+                for dimension in DIMENSIONS:
+                    await cursor.execute(*StatsModel.dimension_query(
+                        dimension, *ranges.get(dimension, (None, None))))
+                    stats[dimension] = [(row['dim_key'], row['user_count'])
+                                        for row in await cursor.fetchall()]
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return stats
@@ -1,305 +1,715 @@
+import asyncio
+import re
+import time
+import uuid
 from datetime import datetime
-from database import get_db_connection
-from fastapi import HTTPException
-from mysql.connector import Error
+from cache import TTLCache
+from config import settings
+from database import connection, Error
+from executor import run_blocking
+from exceptions import HTTPException
+from models.common import date_range, prefix_pattern, stream_rows
+from models.stats import StatsModel
+from pagination import keyset_condition, keyset_order, keyset_page
+from storage import get_image_store, decode_image_payload
+
+
+# Listing totals per normalized filter set; writes in this process clear
+# it. As with the result cache, nothing is cached for DB_REPLICA_MAX_LAG
+# seconds after such a write, so a COUNT from a lagging replica (or one
+# that started before the write) cannot put the old total back.
+_count_cache = TTLCache(maxsize=settings.USER_COUNT_CACHE_SIZE,
+                        ttl=settings.USER_COUNT_CACHE_TTL)
+_last_count_write = 0.0
+
+
+def _count_cache_set(key, value):
+    if time.monotonic() - _last_count_write >= settings.DB_REPLICA_MAX_LAG:
+        _count_cache.set(key, value)
+
+
+# Field name -> SELECT expression for a user row, in response order
+USER_FIELDS = {
+    "id": "u.id",
+    "name": "u.name",
+    "no_hp": "u.no_hp",
+    "prodi": "u.prodi",
+    "take_date": "u.take_date",
+    "image_hash": "u.image_hash",
+    "result_id": "u.result_id",
+    "result_title": "r.title as result_title",
+    "created_at": "u.created_at",
+    "updated_at": "u.updated_at",
+    "deleted_at": "u.deleted_at",
+}
+
+
+def user_select(fields=None):
+    """SELECT over users/results for `fields` (default: all); the join
+    stays either way, listings filter on r.deleted_at"""
+    columns = [expr for name, expr in USER_FIELDS.items() if fields is None or name in fields]
+    return '''
+    SELECT
+        ''' + ''',
+        '''.join(columns) + '''
+    FROM users u
+    LEFT JOIN results r ON u.result_id = r.id
+'''
+
+
+USER_SELECT = user_select()
+
+USER_BY_ID_QUERY = USER_SELECT + '''
+    WHERE u.id = %s
+    AND (r.deleted_at IS NULL OR r.id IS NULL)
+'''
+
+# Read-back after a write: the row as stored, even while the cascade of a
+# just deleted result is still pending
+USER_ROW_BY_ID_QUERY = USER_SELECT + '''
+    WHERE u.id = %s
+'''
 
 
 class UserModel:
+    @staticmethod
+    async def store_image(image: str):
+        """Move an inline base64 image into the image store, returning its hash"""
+        if not image:
+            return None
+        store = get_image_store()
+        data = decode_image_payload(image)
+        return await run_blocking(store.save_bytes, data)
+
+    @staticmethod
+    async def _fetch_user(cursor, user_id: int, query: str = USER_BY_ID_QUERY):
+        """Read a user back on an already borrowed connection"""
+        await cursor.execute(query, (user_id,))
+        return await cursor.fetchone()
+
     @staticmethod
     async def create_user(user_data: dict):
+        image_hash = await UserModel.store_image(user_data.get('image'))
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
-
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            take_date_formatted = user_data['take_date'].strftime(
-                '%Y-%m-%d %H:%M:%S') if user_data.get('take_date') else None
-
-            insert_query = '''
-            INSERT INTO users (name, no_hp, prodi, take_date, image, result_id, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            '''
-
-            values = (
-                user_data['name'],
-                user_data.get('no_hp'),
-                user_data.get('prodi'),
-                take_date_formatted,
-                user_data['image'],
-                user_data.get('result_id'),
-                current_time,
-                current_time
-            )
-
-            # Validate result_id exists if provided
-            if user_data.get('result_id'):
-                check_result_query = "SELECT id FROM results WHERE id = %s"
-                cursor.execute(check_result_query, (user_data['result_id'],))
-                if not cursor.fetchone():
+            async with connection("users.create") as db:
+                cursor = db.cursor()
+
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                take_date_formatted = user_data['take_date'].strftime(
+                    '%Y-%m-%d %H:%M:%S') if user_data.get('take_date') else None
+
+                values = [
+                    user_data['name'],
+                    user_data.get('no_hp'),
+                    user_data.get('prodi'),
+                    take_date_formatted,
+                    image_hash,
+                    current_time,
+                    current_time,
+                    user_data.get('result_id')
+                ]
+
+                if user_data.get('result_id'):
+                    # The result check is folded into the insert: no live
+                    # result row, nothing inserted
+                    insert_query = '''
+                    INSERT INTO users (name, no_hp, prodi, take_date, image_hash, created_at, updated_at, result_id)
+                    SELECT %s, %s, %s, %s, %s, %s, %s, r.id
+                    FROM results r
+                    WHERE r.id = %s AND r.deleted_at IS NULL
+                    '''
+                else:
+                    insert_query = '''
+                    INSERT INTO users (name, no_hp, prodi, take_date, image_hash, created_at, updated_at, result_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    '''
+
+                await cursor.execute(insert_query, values)
+                if cursor.rowcount == 0:
                     raise HTTPException(
-                        status_code=400, 
+                        status_code=400,
                         detail=f"Result with ID {user_data['result_id']} does not exist"
                     )
 
-            cursor.execute(insert_query, values)
-            user_id = cursor.lastrowid
-            db.commit()
+                user_id = cursor.lastrowid
+                await StatsModel.apply_rows(cursor, "id = %s", [user_id], 1)
+                # Read back inside the same transaction, then commit once
+                user = await UserModel._fetch_user(cursor, user_id)
+                await db.commit()
+                UserModel.invalidate_counts()
 
-            # Fetch the created user
-            return await UserModel.get_user_by_id(user_id)
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return user
+
+    @staticmethod
+    async def create_users_bulk(items: list, receipts: bool = False):
+        """Insert many users in one transaction.
+
+        `items` is a list of (index, user_data) pairs; returns one outcome
+        dict per item, in the same order. With receipts=True the indexes
+        are ingestion tracking ids (see ingest.py): each created user is
+        recorded in ingest_receipts in the same transaction, and an id
+        recorded by an earlier attempt reports that user instead of
+        inserting it again.
+        """
+        outcomes = {}
+        pending = []
+
+        for index, user_data in items:
+            try:
+                image_hash = await UserModel.store_image(user_data.get('image'))
+            except ValueError as e:
+                outcomes[index] = {"index": index, "status": "error", "message": str(e)}
+                continue
+            pending.append((index, user_data, image_hash))
+
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        insert_query = '''
+        INSERT INTO users (name, no_hp, prodi, take_date, image_hash, result_id,
+                           created_at, updated_at, insert_key)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        '''
+
+        try:
+            async with connection("users.create_bulk") as db:
+                cursor = db.cursor()
+
+                # Validate every distinct result_id with a single IN query;
+                # soft-deleted results count as missing, as in create_user
+                result_ids = sorted({user_data['result_id'] for _, user_data, _ in pending
+                                     if user_data.get('result_id')})
+                existing = set()
+                if result_ids:
+                    placeholders = ", ".join(["%s"] * len(result_ids))
+                    await cursor.execute(
+                        f"SELECT id FROM results WHERE id IN ({placeholders}) "
+                        f"AND deleted_at IS NULL", result_ids)
+                    existing = {row['id'] for row in await cursor.fetchall()}
+
+                if receipts and pending:
+                    placeholders = ", ".join(["%s"] * len(pending))
+                    await cursor.execute(
+                        f"SELECT tracking_id, user_id FROM ingest_receipts "
+                        f"WHERE tracking_id IN ({placeholders})",
+                        [index for index, _, _ in pending])
+                    for row in await cursor.fetchall():
+                        outcomes[row['tracking_id']] = {
+                            "index": row['tracking_id'], "status": "success", "id": row['user_id']}
+                    pending = [item for item in pending if item[0] not in outcomes]
+
+                rows = []
+                for index, user_data, image_hash in pending:
+                    if user_data.get('result_id') and user_data['result_id'] not in existing:
+                        outcomes[index] = {
+                            "index": index,
+                            "status": "error",
+                            "message": f"Result with ID {user_data['result_id']} does not exist"
+                        }
+                        continue
+                    take_date_formatted = user_data['take_date'].strftime(
+                        '%Y-%m-%d %H:%M:%S') if user_data.get('take_date') else None
+                    # Tracking ids are unique already; other rows get a fresh key
+                    insert_key = index if receipts else uuid.uuid4().hex
+                    rows.append((index, insert_key, (
+                        user_data['name'],
+                        user_data.get('no_hp'),
+                        user_data.get('prodi'),
+                        take_date_formatted,
+                        image_hash,
+                        user_data.get('result_id'),
+                        current_time,
+                        current_time,
+                        insert_key
+                    )))
+
+                chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    await cursor.executemany(insert_query, [values for _, _, values in chunk])
+                    # The ids of one multi-row INSERT need not be consecutive;
+                    # read each back by its key
+                    keys = [key for _, key, _ in chunk]
+                    await cursor.execute(*UserModel.inserted_ids_query(keys))
+                    ids = {row['insert_key']: row['id'] for row in await cursor.fetchall()}
+                    for index, key, _ in chunk:
+                        outcomes[index] = {"index": index, "status": "success", "id": ids[key]}
+                    await StatsModel.apply_rows(cursor, *UserModel.insert_keys_filter(keys), 1)
+                    if receipts:
+                        await cursor.executemany(
+                            "INSERT INTO ingest_receipts (tracking_id, user_id) VALUES (%s, %s)",
+                            [(index, ids[key]) for index, key, _ in chunk])
+
+                await db.commit()
+                if rows:
+                    UserModel.invalidate_counts()
 
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        return [outcomes[index] for index, _ in items]
+
+    @staticmethod
+    def insert_keys_filter(keys: list):
+        """WHERE clause and params for the users rows of one bulk chunk"""
+        return f"insert_key IN ({', '.join(['%s'] * len(keys))})", list(keys)
+
+    @staticmethod
+    def inserted_ids_query(keys: list):
+        where, params = UserModel.insert_keys_filter(keys)
+        return f"SELECT id, insert_key FROM users WHERE {where}", params
+
+    @staticmethod
+    def _build_filters(include_deleted: bool, search: str = None,
+                       from_date: datetime = None, to_date: datetime = None):
+        """WHERE clause, params and optional relevance ORDER BY term
+        shared by the listing queries"""
+        where = " WHERE 1=1"
+
+        # Start with base conditions
+        if not include_deleted:
+            where += " AND u.deleted_at IS NULL"
+
+        # Always check results deleted_at
+        where += " AND (r.deleted_at IS NULL OR r.id IS NULL)"
+
+        params = []
+
+        rank = None
+
+        # Add search condition
+        search = search.strip() if search else None
+        if search:
+            digits = re.sub(r'\D', '', search)
+            words = [w for w in re.sub(r'[+\-<>()~*"@]', ' ', search).split() if len(w) >= 2]
+            if digits and not re.search(r'[^\d\s+\-()]', search):
+                # Phone numbers: prefix range scan on the normalized digits
+                digits = re.sub(r'^62', '0', digits)
+                where += " AND u.no_hp_digits LIKE %s"
+                params.append(f"{digits}%")
+            elif words:
+                # Name / study program: ngram FULLTEXT index, every word required
+                match = "MATCH(u.name, u.prodi) AGAINST (%s IN BOOLEAN MODE)"
+                terms = " ".join(f"+{w}" for w in words)
+                where += f" AND {match}"
+                params.append(terms)
+                rank = (match, [terms])
+            else:
+                # Too short for the ngram index; fall back to a name prefix
+                where += " AND u.name LIKE %s"
+                params.append(prefix_pattern(search))
+
+        # Add date filters
+        dates, date_params = date_range("u.take_date", from_date, to_date)
+        return where + dates, params + date_params, rank
+
+    @staticmethod
+    def _count_cache_key(count_mode: str, include_deleted: bool, search: str = None,
+                         from_date: datetime = None, to_date: datetime = None):
+        return (
+            count_mode,
+            bool(include_deleted),
+            search.strip().lower() if search and search.strip() else None,
+            from_date.isoformat() if from_date else None,
+            to_date.isoformat() if to_date else None,
+        )
+
+    @staticmethod
+    def page_query(page: int, limit: int, include_deleted: bool, search: str = None,
+                    from_date: datetime = None, to_date: datetime = None, fields=None):
+        """SQL and params for one offset page; fetches limit + 1 rows so the
+        caller can tell whether a next page exists"""
+        where, params, rank = UserModel._build_filters(
+            include_deleted, search, from_date, to_date)
+
+        # Best matches first when searching, newest first otherwise
+        order_by = " ORDER BY u.created_at DESC, u.id DESC"
+        order_params = []
+        if rank:
+            order_by = f" ORDER BY {rank[0]} DESC, u.created_at DESC, u.id DESC"
+            order_params = rank[1]
+
+        query = user_select(fields) + where + order_by + " LIMIT %s OFFSET %s"
+        return query, params + order_params + [limit + 1, (page - 1) * limit]
+
+    @staticmethod
+    def count_query(count_mode: str, include_deleted: bool, search: str = None,
+                     from_date: datetime = None, to_date: datetime = None):
+        """Exact COUNT, or for "approximate" an EXPLAIN whose row estimate stands in"""
+        where, params, _ = UserModel._build_filters(
+            include_deleted, search, from_date, to_date)
+        select = "EXPLAIN SELECT 1" if count_mode == "approximate" else "SELECT COUNT(*) as total"
+        query = select + '''
+            FROM users u
+            LEFT JOIN results r ON u.result_id = r.id
+        ''' + where
+        return query, params
 
     @staticmethod
     async def get_users(page: int, limit: int, include_deleted: bool, search: str = None,
-                        from_date: datetime = None, to_date: datetime = None):
+                        from_date: datetime = None, to_date: datetime = None,
+                        count_mode: str = "exact", fields=None):
+        """Returns (users, total_records, has_next)
+
+        count_mode is "exact" (cached COUNT), "approximate" (optimizer
+        estimate) or "none" (no total at all; has_next still works).
+        `fields` limits the columns read (see USER_FIELDS).
+        """
+        base_query, page_params = UserModel.page_query(
+            page, limit, include_deleted, search, from_date, to_date, fields)
+        count_query, params = UserModel.count_query(
+            count_mode, include_deleted, search, from_date, to_date)
+
+        cache_key = UserModel._count_cache_key(
+            count_mode, include_deleted, search, from_date, to_date)
+        total_records = None
+        if count_mode != "none":
+            total_records = _count_cache.get(cache_key)
+
+        async def fetch_total():
+            async with connection("users.count", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(count_query, params)
+                if count_mode != "approximate":
+                    return (await cursor.fetchone())['total']
+                # Estimated rows scanned in users, scaled by the filtered ratio
+                for row in await cursor.fetchall():
+                    if row['table'] == 'u':
+                        return int(row['rows'] * float(row.get('filtered') or 100) / 100)
+                return 0
+
+        async def fetch_page():
+            async with connection("users.page", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(base_query, page_params)
+                return await cursor.fetchall()
+
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
-
-            base_query = '''
-                SELECT
-                    u.id,
-                    u.name,
-                    u.no_hp,
-                    u.prodi,
-                    u.take_date,
-                    u.image,
-                    u.result_id,
-                    r.title as result_title,
-                    u.created_at,
-                    u.updated_at,
-                    u.deleted_at
-                FROM users u
-                LEFT JOIN results r ON u.result_id = r.id
-                WHERE 1=1
-            '''
-
-            # Start with base conditions
-            if not include_deleted:
-                base_query += " AND u.deleted_at IS NULL"
-
-            # Always check results deleted_at
-            base_query += " AND (r.deleted_at IS NULL OR r.id IS NULL)"
-
-            count_query = '''
-                SELECT COUNT(*) as total
-                FROM users u
-                LEFT JOIN results r ON u.result_id = r.id
-                WHERE 1=1
-            '''
-
-            if not include_deleted:
-                count_query += " AND u.deleted_at IS NULL"
-            count_query += " AND (r.deleted_at IS NULL OR r.id IS NULL)"
-
-            params = []
-
-            # Add search condition
-            if search:
-                search_condition = " AND (u.name LIKE %s OR (u.no_hp IS NOT NULL AND u.no_hp LIKE %s)) OR (u.prodi IS NOT NULL AND u.prodi LIKE %s)"
-                base_query += search_condition
-                count_query += search_condition
-                search_param = f"%{search}%"
-                params.extend([search_param, search_param, search_param])
-
-            # Add date filters
-            if from_date:
-                date_condition = " AND u.take_date >= %s"
-                base_query += date_condition
-                count_query += date_condition
-                params.append(from_date)
-
-            if to_date:
-                date_condition = " AND u.take_date <= %s"
-                base_query += date_condition
-                count_query += date_condition
-                params.append(to_date)
-
-            # Get total count
-            cursor.execute(count_query, params)
-            total_records = cursor.fetchone()['total']
-
-            # Add pagination
-            base_query += " ORDER BY u.created_at DESC LIMIT %s OFFSET %s"
-            offset = (page - 1) * limit
-            params.extend([limit, offset])
-
-            cursor.execute(base_query, params)
-            users = cursor.fetchall()
-
-            return users, total_records
+            if count_mode == "none" or total_records is not None:
+                users = await fetch_page()
+            else:
+                # COUNT and page run side by side on separate pooled connections.
+                # Both always finish (and hand their connection back) before
+                # either error is raised.
+                total_records, users = await asyncio.gather(
+                    fetch_total(), fetch_page(), return_exceptions=True)
+                for outcome in (total_records, users):
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                _count_cache_set(cache_key, total_records)
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        has_next = len(users) > limit
+        return users[:limit], total_records, has_next
+
+    @staticmethod
+    def invalidate_counts():
+        global _last_count_write
+        _last_count_write = time.monotonic()
+        _count_cache.invalidate()
+
+    @staticmethod
+    def cursor_query(cursor_token: str, limit: int, include_deleted: bool,
+                      search: str = None, from_date: datetime = None,
+                      to_date: datetime = None, fields=None):
+        """SQL, params and direction for one keyset page (limit + 1 rows);
+        id and created_at are always selected, the cursors are built from them"""
+        where, params, _ = UserModel._build_filters(
+            include_deleted, search, from_date, to_date)
+        keyset, keyset_params, direction = keyset_condition(cursor_token, "u.created_at", "u.id")
+        where += keyset
+        params += keyset_params
+
+        order = keyset_order(direction)
+        if fields is not None:
+            fields = set(fields) | {"id", "created_at"}
+        query = user_select(fields) + where + \
+            f" ORDER BY u.created_at {order}, u.id {order} LIMIT %s"
+        return query, params + [limit + 1], direction
+
+    @staticmethod
+    async def get_users_by_cursor(cursor_token: str, limit: int, include_deleted: bool,
+                                  search: str = None, from_date: datetime = None,
+                                  to_date: datetime = None, fields=None):
+        """Keyset page on (created_at, id); cost does not grow with depth.
+        Search results stay in created_at order here, not relevance order."""
+        select_query, params, direction = UserModel.cursor_query(
+            cursor_token, limit, include_deleted, search, from_date, to_date, fields)
 
+        try:
+            async with connection("users.page_by_cursor", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(select_query, params)
+                users = await cursor.fetchall()
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        return keyset_page(users, limit, direction, cursor_token)
+
+    @staticmethod
+    def export_query(include_deleted: bool, search: str = None,
+                      from_date: datetime = None, to_date: datetime = None):
+        where, params, _ = UserModel._build_filters(
+            include_deleted, search, from_date, to_date)
+        return USER_SELECT + where + " ORDER BY u.id", params
+
+    @staticmethod
+    def stream_users(include_deleted: bool, search: str = None,
+                     from_date: datetime = None, to_date: datetime = None,
+                     fetch_size: int = 1000):
+        """Batches of every matching user; see stream_rows"""
+        select_query, params = UserModel.export_query(
+            include_deleted, search, from_date, to_date)
+        return stream_rows("users.export", select_query, params, fetch_size)
 
     @staticmethod
     async def get_user_by_id(user_id: int):
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
-
-            select_query = '''
-            SELECT
-                u.id,
-                u.name,
-                u.no_hp,
-                u.prodi,
-                u.take_date,
-                u.image,
-                u.result_id,
-                r.title as result_title,
-                u.created_at,
-                u.updated_at,
-                u.deleted_at
-            FROM users u
-            LEFT JOIN results r ON u.result_id = r.id
-            WHERE u.id = %s
-            AND (r.deleted_at IS NULL OR r.id IS NULL)
-            '''
+            async with connection("users.get_by_id", readonly=True) as db:
+                user = await UserModel._fetch_user(db.cursor(), user_id)
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            cursor.execute(select_query, (user_id,))
-            user = cursor.fetchone()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
+        return user
 
-            return user
+    @staticmethod
+    def ids_query(ids: list, fields=None, include_deleted: bool = False):
+        """Same visibility as the listings: soft-deleted users only with
+        include_deleted"""
+        placeholders = ", ".join(["%s"] * len(ids))
+        if fields is not None:
+            fields = set(fields) | {"id"}
+        query = user_select(fields) + f'''
+    WHERE u.id IN ({placeholders})
+    AND (r.deleted_at IS NULL OR r.id IS NULL)
+'''
+        if not include_deleted:
+            query += "    AND u.deleted_at IS NULL\n"
+        return query, list(ids)
 
+    @staticmethod
+    async def get_users_by_ids(ids: list, fields=None, include_deleted: bool = False):
+        """{id: row} for the ids that exist, read with one IN query"""
+        try:
+            async with connection("users.get_by_ids", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(*UserModel.ids_query(ids, fields, include_deleted))
+                rows = await cursor.fetchall()
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        return {user['id']: user for user in rows}
 
     @staticmethod
     async def update_user(user_id: int, user_data: dict):
+        image_hash = await UserModel.store_image(user_data.get('image'))
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
+            async with connection("users.update") as db:
+                cursor = db.cursor()
 
-            # Check if user exists and is not deleted
-            check_query = '''
-            SELECT u.id
-            FROM users u
-            WHERE u.id = %s AND u.deleted_at IS NULL
-            '''
-            cursor.execute(check_query, (user_id,))
-            if not cursor.fetchone():
-                raise HTTPException(
-                    status_code=404, detail="User not found or already deleted")
-
-            # If result_id is provided, check if it exists
-            if 'result_id' in user_data:
-                check_result_query = '''
-                SELECT id
-                FROM results
-                WHERE id = %s AND deleted_at IS NULL
-                '''
-                cursor.execute(check_result_query, (user_data['result_id'],))
-                if not cursor.fetchone():
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Result with ID {user_data['result_id']} does not exist or is deleted"
-                    )
+                take_date_formatted = user_data['take_date'].strftime(
+                    '%Y-%m-%d %H:%M:%S') if user_data.get('take_date') else None
 
-            take_date_formatted = user_data['take_date'].strftime(
-                '%Y-%m-%d %H:%M:%S') if user_data.get('take_date') else None
+                update_parts = []
+                values = []
 
-            update_parts = []
-            values = []
+                # Dynamically build update query based on provided fields
+                if 'name' in user_data:
+                    update_parts.append("name = %s")
+                    values.append(user_data['name'])
 
-            # Dynamically build update query based on provided fields
-            if 'name' in user_data:
-                update_parts.append("name = %s")
-                values.append(user_data['name'])
+                if 'no_hp' in user_data:
+                    update_parts.append("no_hp = %s")
+                    values.append(user_data.get('no_hp'))
 
-            if 'no_hp' in user_data:
-                update_parts.append("no_hp = %s")
-                values.append(user_data.get('no_hp'))
+                if 'prodi' in user_data:
+                    update_parts.append("prodi = %s")
+                    values.append(user_data.get('prodi'))
 
-            if 'prodi' in user_data:
-                update_parts.append("prodi = %s")
-                values.append(user_data.get('prodi'))
+                if 'take_date' in user_data:
+                    update_parts.append("take_date = %s")
+                    values.append(take_date_formatted)
 
-            if 'take_date' in user_data:
-                update_parts.append("take_date = %s")
-                values.append(take_date_formatted)
+                if image_hash:
+                    update_parts.append("image_hash = %s")
+                    values.append(image_hash)
 
-            if 'image' in user_data:
-                update_parts.append("image = %s")
-                values.append(user_data['image'])
+                if 'result_id' in user_data:
+                    update_parts.append("result_id = %s")
+                    values.append(user_data['result_id'])
 
-            if 'result_id' in user_data:
-                update_parts.append("result_id = %s")
-                values.append(user_data['result_id'])
+                # Add updated_at
+                update_parts.append("updated_at = %s")
+                values.append(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
 
-            # Add updated_at
-            update_parts.append("updated_at = %s")
-            values.append(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                # Add user_id for WHERE clause
+                values.append(user_id)
 
-            # Add user_id for WHERE clause
-            values.append(user_id)
+                # Existence of the user and of the new result are both part
+                # of the WHERE clause instead of separate lookups
+                update_query = f'''
+                UPDATE users
+                SET {', '.join(update_parts)}
+                WHERE id = %s AND deleted_at IS NULL
+                '''
+                if 'result_id' in user_data:
+                    update_query += '''
+                    AND EXISTS (
+                        SELECT 1 FROM results
+                        WHERE id = %s AND deleted_at IS NULL
+                    )
+                    '''
+                    values.append(user_data['result_id'])
+
+                # Stats move the user between buckets: lock the row and
+                # remember where it was counted
+                old = None
+                if user_data.keys() & {'result_id', 'prodi', 'take_date'}:
+                    await cursor.execute(
+                        "SELECT result_id, prodi, take_date FROM users "
+                        "WHERE id = %s AND deleted_at IS NULL FOR UPDATE", (user_id,))
+                    old = await cursor.fetchone()
+
+                await cursor.execute(update_query, values)
+
+                if cursor.rowcount == 0:
+                    # Only the failure path pays for finding out which check failed
+                    await cursor.execute(
+                        "SELECT id FROM users WHERE id = %s AND deleted_at IS NULL", (user_id,))
+                    if not await cursor.fetchone():
+                        raise HTTPException(
+                            status_code=404, detail="User not found or already deleted")
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Result with ID {user_data['result_id']} does not exist or is deleted"
+                    )
 
-            update_query = f'''
-            UPDATE users 
-            SET {', '.join(update_parts)}
-            WHERE id = %s AND deleted_at IS NULL
-            '''
+                user = await UserModel._fetch_user(cursor, user_id, USER_ROW_BY_ID_QUERY)
+                if old is not None:
+                    await StatsModel.apply_deltas(cursor, StatsModel.row_deltas(old, user))
+                await db.commit()
+                UserModel.invalidate_counts()
 
-            cursor.execute(update_query, values)
-            db.commit()
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            return await UserModel.get_user_by_id(user_id)
+        return user
+
+    @staticmethod
+    async def delete_user(user_id: int):
+        try:
+            async with connection("users.delete") as db:
+                cursor = db.cursor()
+
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+                update_query = '''
+                UPDATE users
+                SET deleted_at = %s
+                WHERE id = %s AND deleted_at IS NULL
+                '''
+
+                await cursor.execute(update_query, (current_time, user_id))
+                deleted = cursor.rowcount
+                if deleted:
+                    await StatsModel.apply_rows(cursor, "id = %s", [user_id], -1)
+                await db.commit()
+                if deleted:
+                    UserModel.invalidate_counts()
 
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        if deleted == 0:
+            raise HTTPException(
+                status_code=404, detail="User not found or already deleted")
+
+        return {"status": "success", "message": f"User {user_id} successfully deleted"}
 
     @staticmethod
-    async def delete_user(user_id: int):
+    async def delete_users_of_result(result_id: int, deleted_at: str, batch_size: int = 1000):
+        """Soft-delete the live users of a result, one short transaction per
+        batch so no single statement holds row locks on all of them"""
+        total = 0
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
+            async with connection("users.delete_by_result") as db:
+                cursor = db.cursor()
+                while True:
+                    # Lock the batch first so stats count out exactly the
+                    # rows this batch deletes
+                    await cursor.execute('''
+                    SELECT id FROM users
+                    WHERE result_id = %s AND deleted_at IS NULL
+                    LIMIT %s
+                    FOR UPDATE
+                    ''', (result_id, batch_size))
+                    ids = [row['id'] for row in await cursor.fetchall()]
+                    if not ids:
+                        await db.commit()
+                        break
+                    in_ids = f"id IN ({', '.join(['%s'] * len(ids))})"
+                    await StatsModel.apply_rows(cursor, in_ids, ids, -1)
+                    await cursor.execute(
+                        f"UPDATE users SET deleted_at = %s WHERE {in_ids}", [deleted_at] + ids)
+                    await db.commit()
+                    total += len(ids)
+                    if len(ids) < batch_size:
+                        break
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        if total:
+            UserModel.invalidate_counts()
+        return total
 
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    @staticmethod
+    async def get_image_hash(user_id: int):
+        select_query = '''
+        SELECT image_hash
+        FROM users
+        WHERE id = %s AND deleted_at IS NULL
+        '''
 
-            update_query = '''
-            UPDATE users
-            SET deleted_at = %s
-            WHERE id = %s AND deleted_at IS NULL
-            '''
+        try:
+            async with connection("users.get_image_hash", readonly=True) as db:
+                cursor = db.cursor()
+                await cursor.execute(select_query, (user_id,))
+                row = await cursor.fetchone()
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-            cursor.execute(update_query, (current_time, user_id))
-            db.commit()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        if not row['image_hash']:
+            raise HTTPException(status_code=404, detail="User has no image")
 
-            if cursor.rowcount == 0:
-                raise HTTPException(
-                    status_code=404, detail="User not found or already deleted")
+        return row['image_hash']
 
-            return {"status": "success", "message": f"User {user_id} successfully deleted"}
+    @staticmethod
+    async def set_image(user_id: int, image_hash: str):
+        update_query = '''
+        UPDATE users
+        SET image_hash = %s, image = NULL, updated_at = %s
+        WHERE id = %s AND deleted_at IS NULL
+        '''
 
+        try:
+            async with connection("users.set_image") as db:
+                cursor = db.cursor()
+                await cursor.execute(update_query, (
+                    image_hash, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), user_id))
+                await db.commit()
+                updated = cursor.rowcount
         except Error as e:
             raise HTTPException(status_code=500, detail=str(e))
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
+
+        if updated == 0:
+            raise HTTPException(
+                status_code=404, detail="User not found or already deleted")
+
+        return image_hash
@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, row_id: int, direction: str = "next") -> str:
+    """Opaque keyset token for the (created_at, id) position of a row"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": row_id, "d": direction},
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Returns (created_at, id, direction); raises ValueError for bad tokens"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload.get("d", "next")
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(payload["c"]), int(payload["i"]), direction
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+
+
+def keyset_condition(cursor_token: str, created_at_column: str, id_column: str):
+    """(WHERE terms, params, direction) for the page `cursor_token` points
+    at; an empty token is the first page"""
+    if not cursor_token:
+        return "", [], "next"
+    created_at, last_id, direction = decode_cursor(cursor_token)
+    op = "<" if direction == "next" else ">"
+    where = (f" AND ({created_at_column} {op} %s"
+             f" OR ({created_at_column} = %s AND {id_column} {op} %s))")
+    return where, [created_at, created_at, last_id], direction
+
+
+def keyset_order(direction: str) -> str:
+    return "DESC" if direction == "next" else "ASC"
+
+
+def keyset_page(rows: list, limit: int, direction: str, cursor_token: str):
+    """(rows, next_cursor, prev_cursor) from the limit + 1 rows a keyset
+    query fetched; rows come back newest first either way"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(cursor_token)
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'], "next")
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0]['created_at'], rows[0]['id'], "prev")
+    return rows, next_cursor, prev_cursor
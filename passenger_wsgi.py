@@ -1 +1,6 @@
 from app import application
+from config import settings
+
+if settings.WARMUP_ON_START:
+    from warmup import warm_up
+    warm_up(application)
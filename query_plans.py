@@ -0,0 +1,86 @@
+"""EXPLAIN regression checks for the model queries.
+
+Each case builds its SQL through the same model query builders the
+endpoints use and fails when MySQL plans a full table scan or a filesort
+it is not expected to need. Plans depend on table statistics, so run the
+check against a realistically sized database (python -m benchmarks.seed)
+rather than a near-empty one:
+
+    flask db-explain
+"""
+from datetime import datetime, timedelta
+
+from models.result import ResultModel, LIVE_RESULT_BY_ID_QUERY
+from models.stats import StatsModel
+from models.user import UserModel, USER_BY_ID_QUERY
+from pagination import encode_cursor
+
+FULL_SCAN = "full scan"
+FILESORT = "filesort"
+
+
+def _cases():
+    """(name, sql, params, allowed problems)"""
+    now = datetime.now()
+    cursor = encode_cursor(now, 2 ** 62)
+    week_ago = now - timedelta(days=7)
+
+    def case(name, built, allowed=()):
+        # builders return (sql, params) or (sql, params, direction)
+        return name, built[0], built[1], set(allowed)
+
+    return [
+        case("users.page", UserModel.page_query(1, 10, False)),
+        case("users.page_deep", UserModel.page_query(1000, 10, False)),
+        case("users.page_by_cursor", UserModel.cursor_query(cursor, 10, False)),
+        case("users.count", UserModel.count_query("exact", False)),
+        # A take_date range cannot also deliver created_at order
+        case("users.page_take_date",
+             UserModel.page_query(1, 10, False, from_date=week_ago, to_date=now),
+             allowed=[FILESORT]),
+        # Matches are few; ordering them (or by relevance) is cheap
+        case("users.search_phone", UserModel.page_query(1, 10, False, search="0812"),
+             allowed=[FILESORT]),
+        case("users.search_name", UserModel.page_query(1, 10, False, search="budi"),
+             allowed=[FILESORT]),
+        case("users.get_by_id", (USER_BY_ID_QUERY, (1,))),
+        case("users.get_by_ids", UserModel.ids_query([1, 2, 3])),
+        case("users.bulk_inserted_ids", UserModel.inserted_ids_query(["0" * 32])),
+        # A full dump reads every row by design
+        case("users.export", UserModel.export_query(False), allowed=[FULL_SCAN]),
+        case("results.page_by_cursor", ResultModel.cursor_query(None, 10)),
+        case("results.page_by_cursor_next", ResultModel.cursor_query(cursor, 10)),
+        case("results.get_by_id", (LIVE_RESULT_BY_ID_QUERY, (1,))),
+        case("results.get_by_ids", ResultModel.ids_query([1, 2, 3])),
+        case("results.export", ResultModel.export_query()),
+        case("stats.by_result", StatsModel.dimension_query("result")),
+        case("stats.by_take_date", StatsModel.dimension_query(
+            "take_date", week_ago.date().isoformat(), now.date().isoformat())),
+    ]
+
+
+def plan_problems(plan_rows):
+    """Problems found in EXPLAIN output rows (dicts), as (problem, table)"""
+    problems = []
+    for row in plan_rows:
+        if row.get('type') == 'ALL':
+            problems.append((FULL_SCAN, row.get('table')))
+        if 'Using filesort' in (row.get('Extra') or ''):
+            problems.append((FILESORT, row.get('table')))
+    return problems
+
+
+def check_plans(cursor):
+    """Run EXPLAIN for every case on a dictionary cursor.
+
+    Returns [(name, plan_rows, unexpected problems)]; the check passes
+    when every problem list is empty.
+    """
+    report = []
+    for name, sql, params, allowed in _cases():
+        cursor.execute("EXPLAIN " + sql, params)
+        plan = cursor.fetchall()
+        unexpected = [(problem, table) for problem, table in plan_problems(plan)
+                      if problem not in allowed]
+        report.append((name, plan, unexpected))
+    return report
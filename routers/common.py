@@ -0,0 +1,41 @@
+from flask import Response, current_app, jsonify, request, stream_with_context
+from config import settings
+from executor import iterate_async
+from services.common import (ExportEncoder, QueryArgs, OVERLOADED_MESSAGE, error_payload,
+                             is_overloaded)
+
+
+def query_args():
+    return QueryArgs(request.args)
+
+
+def overloaded_response():
+    response = jsonify({"status": "error", "message": OVERLOADED_MESSAGE})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+    return response
+
+
+def error_response(e):
+    if is_overloaded(e):
+        return overloaded_response()
+    return jsonify(error_payload(e)), 400
+
+
+def export_response(export, columns: list, filename: str):
+    """Stream (format, async batches) as NDJSON or CSV without buffering
+    the whole dump"""
+    export_format, batches = export
+    encoder = ExportEncoder(export_format, columns, current_app.json.dumps)
+
+    def generate():
+        header = encoder.header()
+        if header:
+            yield header
+        for rows in iterate_async(batches):
+            yield encoder.encode(rows)
+
+    response = Response(stream_with_context(generate()), mimetype=encoder.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,109 +1,69 @@
-from flask import Blueprint, request, jsonify, abort
-from datetime import datetime
-import asyncio
-from models.result import ResultModel
-from schemas.result import ResultCreate, ResultUpdate, ResultResponse
+from flask import Blueprint, request, jsonify
+from executor import run_async
+from metrics import stage_duration_seconds
+from routers.common import query_args, error_response, export_response
+from services import result as service
 
 
 bp = Blueprint('result', __name__)
 
 
-def run_async(coro):
-    """Helper function to run async code in sync context"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+def conditional_json(payload, etag, last_modified):
+    """JSON response with ETag/Last-Modified; answers a matching
+    If-None-Match / If-Modified-Since with a bare 304"""
+    with stage_duration_seconds.time('results.encode'):
+        response = jsonify(payload)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 
 @bp.route('/', methods=['POST'])
 def create_result():
     try:
-        data = request.get_json()
-        result_data = ResultCreate(**data)  # Validate input data
-        created_result = run_async(
-            ResultModel.create_result(result_data.model_dump()))
-        response_data = ResultResponse(
-            **created_result)  # Validate output data
-        return jsonify({
-            "status": "success",
-            "message": "Result successfully created",
-            "data": response_data.model_dump()
-        })
+        return jsonify(run_async(service.create_result(request.get_json())))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/', methods=['GET'])
 def get_results():
     try:
-        results = run_async(ResultModel.get_all_results())
-        response_data = [ResultResponse(**result).model_dump()
-                        for result in results]
-        return jsonify({
-            "status": "success",
-            "message": "Results successfully retrieved",
-            "data": response_data
-        })
+        return conditional_json(*run_async(service.list_results(query_args())))
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/export', methods=['GET'])
+def export_results():
+    try:
+        return export_response(service.export_results(query_args()),
+                               service.EXPORT_COLUMNS, 'results')
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/<int:result_id>', methods=['GET'])
 def get_result(result_id):
     try:
-        result = run_async(ResultModel.get_result_by_id(result_id))
-        response_data = ResultResponse(**result).model_dump()
-        return jsonify({
-            "status": "success",
-            "message": "Result successfully retrieved",
-            "data": response_data
-        })
+        return conditional_json(*run_async(service.get_result(result_id)))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/<int:result_id>', methods=['PUT'])
 def update_result(result_id):
     try:
-        data = request.get_json()
-        result_data = ResultUpdate(**data)  # Validate input data
-        updated_result = run_async(ResultModel.update_result(
-            result_id, result_data.model_dump(exclude_unset=True)))
-        response_data = ResultResponse(**updated_result).model_dump()
-        return jsonify({
-            "status": "success",
-            "message": "Result successfully updated",
-            "data": response_data
-        })
+        return jsonify(run_async(service.update_result(result_id, request.get_json())))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/<int:result_id>', methods=['DELETE'])
 def delete_result(result_id):
     try:
-        run_async(ResultModel.delete_result(result_id))
-        return jsonify({
-            "status": "success",
-            "message": "Result successfully deleted"
-        })
+        return jsonify(run_async(service.delete_result(result_id)))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
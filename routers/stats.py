@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from executor import run_async
+from routers.common import query_args, error_response
+from services import stats as service
+
+
+bp = Blueprint('stats', __name__)
+
+
+@bp.route('/', methods=['GET'])
+def get_stats():
+    try:
+        return jsonify(run_async(service.get_stats(query_args())))
+    except Exception as e:
+        return error_response(e)
@@ -1,116 +1,99 @@
-from flask import Blueprint, request, jsonify, abort
-from datetime import datetime
-import asyncio
-from models.user import UserModel
-from schemas.user import UserCreate, UserUpdate
+from flask import Blueprint, request, jsonify, send_file, url_for
+from executor import run_async
+from routers.common import query_args, error_response, export_response
+from services import user as service
 
 
 bp = Blueprint('user', __name__)
 
 
-def run_async(coro):
-    """Helper function to run async code in sync context"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+def image_url(user_id, version):
+    return url_for('user.get_user_image', user_id=user_id, v=version)
+
+
+def ingest_status_url(tracking_id):
+    return url_for('user.get_ingest_status', tracking_id=tracking_id)
 
 
 @bp.route('/', methods=['POST'])
 def create_user():
     try:
-        data = request.get_json()
-        user_data = UserCreate(**data)  # Validate using Pydantic model
-        created_user = run_async(UserModel.create_user(user_data.model_dump()))
-        return jsonify({
-            "status": "success",
-            "message": "User successfully created",
-            "data": created_user
-        })
+        # ?async=1: queue it, 202 now, the flusher inserts it shortly
+        if query_args().bool('async', False):
+            payload = run_async(service.ingest_user(request.get_json(), ingest_status_url))
+            return jsonify(payload), 202, {'Location': payload['data']['status_url']}
+        return jsonify(run_async(service.create_user(request.get_json(), image_url)))
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/ingest/<tracking_id>', methods=['GET'])
+def get_ingest_status(tracking_id):
+    try:
+        return jsonify(run_async(service.ingest_status(tracking_id)))
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/bulk', methods=['POST'])
+def create_users_bulk():
+    try:
+        return jsonify(run_async(service.create_users_bulk(request.get_json())))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/', methods=['GET'])
 def get_users():
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 10, type=int)
-        include_deleted = request.args.get('include_deleted', False, type=bool)
-        search = request.args.get('search', None)
-        from_date = request.args.get('from_date')
-        to_date = request.args.get('to_date')
-
-        # Convert date strings to datetime objects if provided
-        if from_date:
-            from_date = datetime.fromisoformat(from_date)
-        if to_date:
-            to_date = datetime.fromisoformat(to_date)
-
-        # Validate pagination parameters
-        if page < 1:
-            page = 1
-        if limit < 1:
-            limit = 1
-        elif limit > 100:
-            limit = 100
-
-        users, total_records = run_async(UserModel.get_users(
-            page, limit, include_deleted, search, from_date, to_date
-        ))
-
-        total_pages = (total_records + limit - 1) // limit
-
-        return jsonify({
-            "status": "success",
-            "data": users,
-            "pagination": {
-                "total_records": total_records,
-                "total_pages": total_pages,
-                "current_page": page,
-                "limit": limit,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
-        })
+        return jsonify(run_async(service.list_users(query_args(), image_url)))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
+
+
+@bp.route('/export', methods=['GET'])
+def export_users():
+    try:
+        return export_response(service.export_users(query_args()),
+                               service.EXPORT_COLUMNS, 'users')
+    except Exception as e:
+        return error_response(e)
 
 
 @bp.route('/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     try:
-        data = request.get_json()
-        user_data = UserUpdate(**data)  # Validate using Pydantic model
-        updated_user = run_async(UserModel.update_user(
-            user_id, user_data.model_dump()))
-        return jsonify({
-            "status": "success",
-            "message": "User successfully updated",
-            "data": updated_user
-        })
+        return jsonify(run_async(service.update_user(user_id, request.get_json(), image_url)))
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
 
 
 @bp.route('/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     try:
-        result = run_async(UserModel.delete_user(user_id))
-        return jsonify(result)
+        return jsonify(run_async(service.delete_user(user_id)))
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/<int:user_id>/image', methods=['PUT', 'POST'])
+def upload_user_image(user_id):
+    try:
+        # Raw body is streamed straight into the store; multipart also works
+        stream = request.files['image'].stream if 'image' in request.files else request.stream
+        return jsonify(run_async(service.upload_user_image(user_id, stream, image_url)))
+    except Exception as e:
+        return error_response(e)
+
+
+@bp.route('/<int:user_id>/image', methods=['GET'])
+def get_user_image(user_id):
+    try:
+        path, mimetype, image_hash = run_async(service.user_image(user_id))
+        # send_file answers Range and If-None-Match/If-Modified-Since itself
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=image_hash)
+        response.headers['Cache-Control'] = service.image_cache_control(
+            request.args.get('v'), image_hash)
+        return response
     except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+        return error_response(e)
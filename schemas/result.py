@@ -1,8 +1,6 @@
-from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from mysql.connector import Error
 
 
 class ResultCreate(BaseModel):
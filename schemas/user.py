@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 def validate_user_create(data):
     if not data:
@@ -15,11 +15,13 @@ def validate_user_update(data):
 
 
 class UserBase(BaseModel):
-    name: str
-    no_hp: Optional[str] = None
-    prodi: Optional[str] = None
+    # Lengths match the users columns, so a row too long for MySQL fails
+    # validation on its own instead of aborting a bulk insert
+    name: str = Field(max_length=255)
+    no_hp: Optional[str] = Field(default=None, max_length=20)
+    prodi: Optional[str] = Field(default=None, max_length=255)
     take_date: Optional[datetime] = None
-    image: str
+    image: Optional[str] = None  # inline base64; stored in the image store
     result_id: int
 
 
@@ -33,6 +35,23 @@ class UserUpdate(UserBase):
 
 class UserInDB(UserBase):
     id: int
+    image_hash: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    deleted_at: Optional[datetime] = None
+
+
+class UserRow(BaseModel):
+    """Shape of a row returned by the UserModel SELECTs"""
+    id: int
+    name: str
+    no_hp: Optional[str] = None
+    prodi: Optional[str] = None
+    take_date: Optional[date] = None
+    image_hash: Optional[str] = None
+    result_id: Optional[int] = None
+    result_title: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     deleted_at: Optional[datetime] = None
@@ -0,0 +1,49 @@
+import random
+from pydantic import TypeAdapter, create_model
+from config import settings
+
+
+_adapters = {}
+_partials = {}
+
+
+def _list_adapter(model):
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(list[model])
+    return adapter
+
+
+def partial_model(model, fields):
+    """`model` cut down to `fields`, for rows from a sparse SELECT"""
+    key = (model, frozenset(fields))
+    partial = _partials.get(key)
+    if partial is None:
+        partial = _partials[key] = create_model(
+            f"{model.__name__}Partial",
+            **{name: (field.annotation, field)
+               for name, field in model.model_fields.items() if name in fields})
+    return partial
+
+
+def prepare_adapters(*models):
+    """Build list adapters ahead of the first request (see warmup.py)"""
+    for model in models:
+        _list_adapter(model)
+
+
+def validate_rows(model, rows, mode: str = None):
+    """Check DB rows against a response schema and return them unchanged.
+
+    mode (default RESPONSE_VALIDATION):
+      "full"   - validate every response, whole list in one pydantic-core call
+      "sample" - validate a RESPONSE_VALIDATION_SAMPLE_RATE share of responses
+      "off"    - trust rows from our own fixed-column SELECTs as they are
+    """
+    mode = mode or settings.RESPONSE_VALIDATION
+    if mode == "off" or not rows:
+        return rows
+    if mode == "sample" and random.random() >= settings.RESPONSE_VALIDATION_SAMPLE_RATE:
+        return rows
+    _list_adapter(model).validate_python(rows)
+    return rows
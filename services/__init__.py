@@ -0,0 +1,3 @@
+from . import user
+from . import result
+from . import stats
@@ -0,0 +1,113 @@
+"""Pieces shared by the Flask routers and the ASGI app"""
+import csv
+import io
+from datetime import datetime
+
+from database import PoolTimeout
+from exceptions import caused_by
+
+
+class QueryArgs:
+    """Read-only query string access with Flask's `get(name, default, type)`
+    semantics, over werkzeug's MultiDict or Starlette's QueryParams"""
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+    def get(self, name, default=None, type=None):
+        value = self._mapping.get(name)
+        if value is None:
+            return default
+        if type is None:
+            return value
+        try:
+            return type(value)
+        except (ValueError, TypeError):
+            return default
+
+    def bool(self, name, default=False):
+        value = self._mapping.get(name)
+        if value is None:
+            return default
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+    def date(self, name):
+        value = self._mapping.get(name)
+        return datetime.fromisoformat(value) if value else None
+
+    def __contains__(self, name):
+        return name in self._mapping
+
+
+def error_payload(e):
+    return {"status": "error", "message": str(e)}
+
+
+OVERLOADED_MESSAGE = "Server is busy, please retry shortly"
+
+
+def is_overloaded(e):
+    """True when the error comes from running out of database connections"""
+    return caused_by(e, PoolTimeout)
+
+
+def parse_ids(value, max_count):
+    """Distinct positive ids from "1,2,3", in the order given"""
+    ids = {}
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit() or int(part) < 1:
+            raise ValueError(f"Invalid id: {part!r}")
+        ids[int(part)] = None
+        # Stop at the limit rather than parse an arbitrarily long list
+        if len(ids) > max_count:
+            raise ValueError(f"At most {max_count} ids per request")
+    if not ids:
+        raise ValueError("ids must list at least one id")
+    return list(ids)
+
+
+def export_format(args):
+    value = args.get('format', 'ndjson').lower()
+    if value not in ('ndjson', 'csv'):
+        raise ValueError("format must be 'ndjson' or 'csv'")
+    return value
+
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+class ExportEncoder:
+    """Turns row batches into NDJSON or CSV text chunks"""
+
+    def __init__(self, export_format, columns, dumps):
+        self.export_format = export_format
+        self.columns = columns
+        self._dumps = dumps
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    @property
+    def mimetype(self):
+        return EXPORT_MIMETYPES[self.export_format]
+
+    def header(self):
+        if self.export_format != 'csv':
+            return ""
+        return self._csv([self.columns])
+
+    def encode(self, rows):
+        if self.export_format != 'csv':
+            return "".join(self._dumps(row) + "\n" for row in rows)
+        return self._csv([
+            ['' if row[column] is None else row[column] for column in self.columns]
+            for row in rows
+        ])
+
+    def _csv(self, lines):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerows(lines)
+        return self._buffer.getvalue()
@@ -0,0 +1,131 @@
+"""/results endpoint logic, shared by routers/result.py (Flask) and asgi.py.
+
+Read handlers return (payload, etag, last_modified) so either web layer
+can answer conditional requests with a bare 304. Listings send no
+Last-Modified: a delete or a filter change alters the rows listed without
+raising max(updated_at), so only the ETag, over every listed row, can say
+a listing is unchanged.
+"""
+import hashlib
+
+from config import settings
+from metrics import stage_duration_seconds
+from models.result import ResultModel
+from schemas.result import ResultCreate, ResultUpdate, ResultResponse
+from schemas.validation import validate_rows
+from services.common import export_format, parse_ids
+
+
+EXPORT_COLUMNS = ['id', 'title', 'description', 'created_at', 'updated_at']
+
+
+def listing_filters(args):
+    """(include_deleted, search, from_date, to_date) from the query string"""
+    return (
+        args.bool('include_deleted', False),
+        args.get('search', None),
+        args.date('from_date'),
+        args.date('to_date'),
+    )
+
+
+def etag_of(rows, extra=""):
+    """ETag over the rows' ids and updated_at; `extra` folds anything else
+    in the payload (page links) into it"""
+    return hashlib.md5((extra + "|" + "|".join(
+        f"{row['id']}:{row['updated_at'].isoformat()}" for row in rows
+    )).encode()).hexdigest()
+
+
+async def create_result(data):
+    result_data = ResultCreate(**data)  # Validate input data
+    created_result = await ResultModel.create_result(result_data.model_dump())
+    validate_rows(ResultResponse, [created_result])  # Validate output data
+    return {
+        "status": "success",
+        "message": "Result successfully created",
+        "data": created_result
+    }
+
+
+async def get_results_batch(ids):
+    found = await ResultModel.get_results_by_ids(ids)
+    results = [found[result_id] for result_id in ids if result_id in found]
+    missing = [result_id for result_id in ids if result_id not in found]
+    validate_rows(ResultResponse, results)
+    payload = {
+        "status": "success",
+        "message": "Results successfully retrieved",
+        "data": results,
+        "missing": missing
+    }
+    return payload, etag_of(results, f"missing:{missing}"), None
+
+
+async def list_results(args):
+    # ?ids=1,2,3 fetches exactly those results, in that order
+    if 'ids' in args:
+        return await get_results_batch(parse_ids(args.get('ids'), settings.BATCH_LOOKUP_MAX_IDS))
+
+    limit = args.get('limit', 10, type=int)
+    cursor = args.get('cursor')
+    limit = min(max(limit, 1), 100)
+
+    # Keyset pages on (created_at, id); follow next_cursor for more
+    results, next_cursor, prev_cursor = await ResultModel.get_results_by_cursor(
+        cursor, limit, *listing_filters(args)
+    )
+    with stage_duration_seconds.time('results.validate'):
+        validate_rows(ResultResponse, results)
+    # Rows go to the JSON encoder as-is; no model_dump() copies
+    payload = {
+        "status": "success",
+        "message": "Results successfully retrieved",
+        "data": results,
+        "pagination": {
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            "has_next": next_cursor is not None,
+            "has_prev": prev_cursor is not None
+        }
+    }
+    return payload, etag_of(results, f"{next_cursor}:{prev_cursor}"), None
+
+
+def export_results(args):
+    """(format, async generator of row batches); nothing runs until iterated"""
+    fmt = export_format(args)
+    return fmt, ResultModel.stream_results(*listing_filters(args), settings.EXPORT_FETCH_SIZE)
+
+
+async def get_result(result_id):
+    result = await ResultModel.get_result_by_id(result_id)
+    validate_rows(ResultResponse, [result])
+    payload = {
+        "status": "success",
+        "message": "Result successfully retrieved",
+        "data": result
+    }
+    return payload, etag_of([result]), result['updated_at']
+
+
+async def update_result(result_id, data):
+    result_data = ResultUpdate(**data)  # Validate input data
+    updated_result = await ResultModel.update_result(
+        result_id, result_data.model_dump(exclude_unset=True))
+    validate_rows(ResultResponse, [updated_result])
+    return {
+        "status": "success",
+        "message": "Result successfully updated",
+        "data": updated_result
+    }
+
+
+async def delete_result(result_id):
+    deleted = await ResultModel.delete_result(result_id)
+    return {
+        "status": "success",
+        "message": "Result successfully deleted",
+        "data": deleted
+    }
@@ -0,0 +1,21 @@
+"""/stats endpoint logic, shared by routers/stats.py (Flask) and asgi.py"""
+from models.stats import StatsModel
+
+
+async def get_stats(args):
+    """Dashboard counts of live users; from_date/to_date narrow by_take_date"""
+    stats = await StatsModel.get_stats(args.date('from_date'), args.date('to_date'))
+    return {
+        "status": "success",
+        "message": "Stats successfully retrieved",
+        "data": {
+            # every live user has exactly one prodi bucket ('' included)
+            "total_users": sum(count for _, count in stats['prodi']),
+            "by_result": [{"result_id": int(key) if key else None, "users": count}
+                          for key, count in stats['result']],
+            "by_prodi": [{"prodi": key or None, "users": count}
+                         for key, count in stats['prodi']],
+            "by_take_date": [{"take_date": key or None, "users": count}
+                             for key, count in stats['take_date']],
+        }
+    }
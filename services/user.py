@@ -0,0 +1,268 @@
+"""/users endpoint logic, shared by routers/user.py (Flask) and asgi.py.
+
+Handlers take parsed input and return the JSON payload; the web layer
+owns status codes, headers and streaming. `image_url(user_id, version)`
+builds the image link in the caller's URL space.
+"""
+from config import settings
+from exceptions import HTTPException
+from executor import run_blocking
+from ingest import PENDING, get_ingest_queue
+from models.user import UserModel, USER_FIELDS
+from schemas.user import UserCreate, UserUpdate, UserRow
+from schemas.validation import partial_model, validate_rows
+from services.common import export_format, parse_ids
+from storage import get_image_store, sniff_mimetype
+
+
+EXPORT_COLUMNS = ['id', 'name', 'no_hp', 'prodi', 'take_date', 'image_hash',
+                  'result_id', 'result_title', 'created_at', 'updated_at', 'deleted_at']
+
+
+def with_image_url(user, image_url):
+    """Listings carry a versioned image URL instead of the image itself"""
+    image_hash = user.get('image_hash')
+    user['image_url'] = image_url(user['id'], image_hash[:16]) if image_hash else None
+    return user
+
+
+async def create_user(data, image_url):
+    user_data = UserCreate(**data)  # Validate using Pydantic model
+    created_user = await UserModel.create_user(user_data.model_dump())
+    return {
+        "status": "success",
+        "message": "User successfully created",
+        "data": with_image_url(validate_rows(UserRow, [created_user])[0], image_url)
+    }
+
+
+async def ingest_user(data, status_url):
+    """Validate and queue a submission for the write-behind flusher
+    (ingest.py); `status_url(tracking_id)` builds the status link"""
+    payload = UserCreate(**data).model_dump_json()
+    tracking_id = await run_blocking(get_ingest_queue().append, payload)
+    return {
+        "status": "success",
+        "message": "User accepted for processing",
+        "data": {
+            "tracking_id": tracking_id,
+            "state": PENDING,
+            "status_url": status_url(tracking_id)
+        }
+    }
+
+
+async def ingest_status(tracking_id):
+    status = await run_blocking(get_ingest_queue().status, tracking_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown tracking id")
+    return {"status": "success", "data": status}
+
+
+async def create_users_bulk(data):
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list) or not data:
+        raise ValueError("Expected a non-empty list of users")
+    if len(data) > settings.BULK_MAX_ITEMS:
+        raise ValueError(f"At most {settings.BULK_MAX_ITEMS} users per request")
+
+    # Validate everything up front; invalid items fail individually
+    outcomes = {}
+    valid = []
+    for index, item in enumerate(data):
+        try:
+            valid.append((index, UserCreate(**item).model_dump()))
+        except Exception as e:
+            outcomes[index] = {"index": index, "status": "error", "message": str(e)}
+
+    if valid:
+        for outcome in await UserModel.create_users_bulk(valid):
+            outcomes[outcome['index']] = outcome
+
+    items = [outcomes[index] for index in range(len(data))]
+    created = sum(1 for item in items if item['status'] == "success")
+    return {
+        "status": "success",
+        "message": f"{created} of {len(items)} users created",
+        "data": {
+            "created": created,
+            "failed": len(items) - created,
+            "items": items
+        }
+    }
+
+
+def parse_fields(value):
+    """Requested response fields from "id,name,take_date", or None for all"""
+    if value is None:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in USER_FIELDS and name != 'image_url']
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not fields:
+        raise ValueError("fields must name at least one field")
+    return fields
+
+
+def select_fields(fields):
+    """Columns to read for the requested fields; image_url is built from
+    image_hash, and id is always needed"""
+    if fields is None:
+        return None
+    columns = {name for name in fields if name != 'image_url'} | {'id'}
+    if 'image_url' in fields:
+        columns.add('image_hash')
+    return columns
+
+
+def shape_users(users, fields, image_url):
+    """Validate rows from the listing SELECTs and cut them to `fields`"""
+    if fields is None:
+        return [with_image_url(user, image_url) for user in validate_rows(UserRow, users)]
+    if users:
+        validate_rows(partial_model(UserRow, users[0].keys()), users)
+    if 'image_url' in fields:
+        users = [with_image_url(user, image_url) for user in users]
+    return [{name: user[name] for name in fields} for user in users]
+
+
+async def get_users_batch(ids, image_url, fields=None, include_deleted=False):
+    found = await UserModel.get_users_by_ids(ids, select_fields(fields), include_deleted)
+    users = [found[user_id] for user_id in ids if user_id in found]
+    return {
+        "status": "success",
+        "data": shape_users(users, fields, image_url),
+        "missing": [user_id for user_id in ids if user_id not in found]
+    }
+
+
+async def list_users(args, image_url):
+    # ?ids=1,2,3 fetches exactly those users, in that order
+    fields = parse_fields(args.get('fields'))
+    include_deleted = args.bool('include_deleted', False)
+    if 'ids' in args:
+        return await get_users_batch(
+            parse_ids(args.get('ids'), settings.BATCH_LOOKUP_MAX_IDS), image_url, fields,
+            include_deleted)
+
+    page = args.get('page', 1, type=int)
+    limit = args.get('limit', 10, type=int)
+    search = args.get('search', None)
+    from_date = args.date('from_date')
+    to_date = args.date('to_date')
+    cursor = args.get('cursor')
+
+    # Validate pagination parameters
+    if page < 1:
+        page = 1
+    if limit < 1:
+        limit = 1
+    elif limit > 100:
+        limit = 100
+
+    # Opt-in keyset mode: pass ?cursor= (empty for the first page)
+    if cursor is not None:
+        users, next_cursor, prev_cursor = await UserModel.get_users_by_cursor(
+            cursor, limit, include_deleted, search, from_date, to_date, select_fields(fields)
+        )
+
+        return {
+            "status": "success",
+            "data": shape_users(users, fields, image_url),
+            "pagination": {
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "has_next": next_cursor is not None,
+                "has_prev": prev_cursor is not None
+            }
+        }
+
+    if not args.bool('with_total', True):
+        count_mode = "none"
+    elif args.bool('approximate_count', False):
+        count_mode = "approximate"
+    else:
+        count_mode = "exact"
+
+    users, total_records, has_next = await UserModel.get_users(
+        page, limit, include_deleted, search, from_date, to_date, count_mode,
+        select_fields(fields)
+    )
+
+    total_pages = None
+    if total_records is not None:
+        total_pages = (total_records + limit - 1) // limit
+
+    return {
+        "status": "success",
+        "data": shape_users(users, fields, image_url),
+        "pagination": {
+            "total_records": total_records,
+            "total_pages": total_pages,
+            "approximate": count_mode == "approximate",
+            "current_page": page,
+            "limit": limit,
+            "has_next": has_next,
+            "has_prev": page > 1
+        }
+    }
+
+
+def export_users(args):
+    """(format, async generator of row batches); nothing runs until iterated"""
+    fmt = export_format(args)
+    batches = UserModel.stream_users(
+        args.bool('include_deleted', False),
+        args.get('search', None),
+        args.date('from_date'),
+        args.date('to_date'),
+        settings.EXPORT_FETCH_SIZE
+    )
+    return fmt, batches
+
+
+async def update_user(user_id, data, image_url):
+    user_data = UserUpdate(**data)  # Validate using Pydantic model
+    updated_user = await UserModel.update_user(user_id, user_data.model_dump())
+    return {
+        "status": "success",
+        "message": "User successfully updated",
+        "data": with_image_url(validate_rows(UserRow, [updated_user])[0], image_url)
+    }
+
+
+async def delete_user(user_id):
+    return await UserModel.delete_user(user_id)
+
+
+async def upload_user_image(user_id, stream, image_url):
+    """`stream` is a blocking file-like object; it is read on the executor"""
+    image_hash = await run_blocking(get_image_store().save_stream, stream)
+    await UserModel.set_image(user_id, image_hash)
+    return {
+        "status": "success",
+        "message": "Image successfully uploaded",
+        "data": with_image_url({"id": user_id, "image_hash": image_hash}, image_url)
+    }
+
+
+def _sniff(path):
+    with open(path, 'rb') as f:
+        return sniff_mimetype(f.read(16))
+
+
+async def user_image(user_id):
+    """(path, mimetype, image_hash) of a user's stored image"""
+    image_hash = await UserModel.get_image_hash(user_id)
+    path = get_image_store().path(image_hash)
+    return path, await run_blocking(_sniff, path), image_hash
+
+
+def image_cache_control(requested_version, image_hash):
+    if requested_version == image_hash[:16]:
+        # Versioned URLs never change content
+        return 'public, max-age=31536000, immutable'
+    return 'public, max-age=60'
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import hashlib
+import importlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from config import settings
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore(ABC):
+    """Interface for user image storage; blobs are addressed by content hash"""
+
+    @abstractmethod
+    def save_stream(self, stream) -> str:
+        ...
+
+    @abstractmethod
+    def save_bytes(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def path(self, digest: str) -> str:
+        """Local file path for send_file; stores without one raise"""
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+
+class LocalImageStore(ImageStore):
+    """Content-addressed files under `root`, sharded as ab/cd/<sha256>"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError("Invalid image hash")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def save_stream(self, stream) -> str:
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(
+                            f"Image exceeds the {self.max_bytes} byte limit")
+                    sha.update(chunk)
+                    tmp.write(chunk)
+            if size == 0:
+                raise ValueError("Image is empty")
+
+            digest = sha.hexdigest()
+            final_path = self.path(digest)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return digest
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save_bytes(self, data: bytes) -> str:
+        return self.save_stream(io.BytesIO(data))
+
+
+_store = None
+
+
+def get_image_store() -> ImageStore:
+    """Store configured by IMAGE_STORE_BACKEND ("module.ClassName")"""
+    global _store
+    if _store is None:
+        module_name, class_name = settings.IMAGE_STORE_BACKEND.rsplit(".", 1)
+        store_class = getattr(importlib.import_module(module_name), class_name)
+        _store = store_class(settings.IMAGE_STORE_DIR, settings.IMAGE_MAX_BYTES)
+    return _store
+
+
+def decode_image_payload(payload: str) -> bytes:
+    """Bytes of a base64 image, with or without a data: URL prefix"""
+    if payload.startswith("data:"):
+        payload = payload.split(",", 1)[-1]
+    try:
+        return base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError("Image is not valid base64") from e
+
+
+def sniff_mimetype(head: bytes) -> str:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
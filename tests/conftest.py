@@ -0,0 +1,99 @@
+import os
+import sys
+
+import pytest
+
+# The application modules are top-level (config, database, ...), as under
+# passenger_wsgi.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    """mysql.connector cursor stand-in; FakeDatabase.handler answers each
+    statement with rows (a list) or a rowcount (an int)"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        database = self.connection.database
+        query = " ".join(query.split())
+        database.queries.append((query, params))
+        result = database.handler(query, params)
+        if isinstance(result, int):
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result or [])
+            self.rowcount = len(self.rows)
+        self.lastrowid = database.lastrowid
+
+    def executemany(self, query, seq_params):
+        for params in seq_params:
+            self.execute(query, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database=None):
+        self.database = database
+        self.in_transaction = False
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.alive = True
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            from mysql.connector import errors
+            raise errors.InterfaceError("MySQL Connection not available")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.queries = []
+        self.lastrowid = None
+        self.handler = lambda query, params: []
+
+    def connect(self, **kwargs):
+        return FakeConnection(self)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Route database.connection() to an in-memory FakeDatabase"""
+    import database
+
+    db = FakeDatabase()
+    monkeypatch.setattr(database, "get_db_connection", db.connect)
+    monkeypatch.setattr(database, "get_read_connection", db.connect)
+    return db
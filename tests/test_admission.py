@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import HIGH, LOW, NORMAL, AdmissionController, request_priority
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def queued(controller):
+    return sum(controller.stats()["queued"].values())
+
+
+def start_waiter(controller, priority, results, name):
+    thread = threading.Thread(
+        target=lambda: results.append((name, controller.acquire(priority))))
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("method, path, priority", [
+    ("GET", "/", None),
+    ("GET", "/metrics", None),
+    ("OPTIONS", "/users/", None),
+    ("GET", "/users/export", LOW),
+    ("POST", "/users/bulk", LOW),
+    ("GET", "/results/", HIGH),
+    ("HEAD", "/stats/", HIGH),
+    ("PUT", "/results/1", NORMAL),
+    ("GET", "/users/", NORMAL),
+])
+def test_request_priority(method, path, priority):
+    assert request_priority(method, path) == priority
+
+
+def test_admits_up_to_limit_and_releases():
+    controller = AdmissionController(limit=2, max_queue=0, timeout=0.01)
+    assert controller.acquire()
+    assert controller.acquire()
+    assert controller.stats()["active"] == 2
+    controller.release()
+    controller.release()
+    assert controller.stats()["active"] == 0
+
+
+def test_sheds_when_queue_is_full():
+    controller = AdmissionController(limit=1, max_queue=0, timeout=1.0)
+    assert controller.acquire()
+    started = time.monotonic()
+    assert not controller.acquire()
+    # Shed at once, not after the queue timeout
+    assert time.monotonic() - started < 0.5
+
+
+def test_times_out_and_leaves_the_queue():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=0.05)
+    assert controller.acquire()
+    assert not controller.acquire()
+    assert queued(controller) == 0
+    assert controller.stats()["active"] == 1
+
+
+def test_release_hands_the_slot_to_a_waiter():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+    assert controller.acquire()
+    results = []
+    thread = start_waiter(controller, NORMAL, results, "waiter")
+    wait_until(lambda: queued(controller) == 1)
+
+    controller.release()
+    thread.join(2.0)
+    assert results == [("waiter", True)]
+    # The slot passed over directly; it was never free in between
+    assert controller.stats()["active"] == 1
+    controller.release()
+    assert controller.stats()["active"] == 0
+
+
+def test_best_priority_is_admitted_first():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+    assert controller.acquire()
+    results = []
+    threads = [start_waiter(controller, LOW, results, "low")]
+    wait_until(lambda: queued(controller) == 1)
+    threads.append(start_waiter(controller, NORMAL, results, "normal"))
+    wait_until(lambda: queued(controller) == 2)
+    threads.append(start_waiter(controller, HIGH, results, "high"))
+    wait_until(lambda: queued(controller) == 3)
+
+    for expected in ("high", "normal", "low"):
+        controller.release()
+        wait_until(lambda: len(results) == ["high", "normal", "low"].index(expected) + 1)
+        assert results[-1] == (expected, True)
+    for thread in threads:
+        thread.join(2.0)
+    controller.release()
+    assert controller.stats()["active"] == 0
+
+
+def test_abandon_after_hand_off_keeps_the_slot():
+    # The wait timed out just as release() granted the slot: the waiter
+    # must take it rather than drop it
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+    assert controller.acquire()
+    with controller._lock:
+        waiter = controller._enter(NORMAL, lambda: None)
+    controller.release()
+    assert controller._abandon(waiter)
+    assert controller.stats()["active"] == 1
+    assert queued(controller) == 0
+
+
+def test_abandon_before_hand_off_leaves_the_queue():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+    assert controller.acquire()
+    with controller._lock:
+        waiter = controller._enter(NORMAL, lambda: None)
+    assert not controller._abandon(waiter)
+    assert queued(controller) == 0
+    # Nobody is waiting, so release frees the slot
+    controller.release()
+    assert controller.stats()["active"] == 0
+
+
+def test_acquire_async_is_woken_by_release():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+
+    async def main():
+        assert await controller.acquire_async()
+        waiter = asyncio.ensure_future(controller.acquire_async(HIGH))
+        await asyncio.sleep(0.01)
+        assert queued(controller) == 1
+        # Released from another thread, as the WSGI side would
+        threading.Thread(target=controller.release).start()
+        return await asyncio.wait_for(waiter, 2.0)
+
+    assert asyncio.run(main())
+    assert controller.stats()["active"] == 1
+
+
+def test_acquire_async_times_out():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=0.05)
+
+    async def main():
+        assert await controller.acquire_async()
+        return await controller.acquire_async()
+
+    assert not asyncio.run(main())
+    assert queued(controller) == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+
+    async def main():
+        assert await controller.acquire_async()
+        waiter = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert queued(controller) == 0
+    assert controller.stats()["active"] == 1
+
+
+def test_cancel_racing_a_hand_off_never_loses_the_slot():
+    controller = AdmissionController(limit=1, max_queue=5, timeout=2.0)
+
+    async def main():
+        assert await controller.acquire_async()
+        waiter = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        # Slot handed over, then the client goes away before it runs
+        controller.release()
+        waiter.cancel()
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            return
+        # The cancellation lost the race: the caller holds the slot
+        assert admitted
+        controller.release()
+
+    asyncio.run(main())
+    assert controller.stats()["active"] == 0
+    assert queued(controller) == 0
@@ -0,0 +1,34 @@
+from archive import finish_cascades
+
+from conftest import FakeDatabase
+
+
+def pending_users(ids):
+    """Users of deleted results, soft-deleted as the cascade updates them"""
+    database = FakeDatabase()
+
+    def handler(query, params):
+        if query.startswith("SELECT COUNT(*)"):
+            return [(len(ids),)]
+        if query.startswith("SELECT u.id"):
+            return [(user_id,) for user_id in ids[:params[0]]]
+        if query.startswith("UPDATE users"):
+            del ids[:len(params)]
+            return len(params)
+        return 1
+
+    database.handler = handler
+    return database.connect()
+
+
+def test_dry_run_counts_every_pending_user():
+    db = pending_users(list(range(1, 8)))
+    assert finish_cascades(db, batch_size=3, dry_run=True, echo=lambda message: None) == 7
+    assert db.commits == 0
+    assert [query for query, _ in db.database.queries if query.startswith("UPDATE")] == []
+
+
+def test_cascade_runs_in_committed_batches():
+    db = pending_users(list(range(1, 8)))
+    assert finish_cascades(db, batch_size=3, echo=lambda message: None) == 7
+    assert db.commits == 3
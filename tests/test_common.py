@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from services.common import parse_ids
+
+
+def test_parse_ids_keeps_order_and_drops_duplicates():
+    assert parse_ids(" 3, 1,3,,2 ,1", 10) == [3, 1, 2]
+
+
+@pytest.mark.parametrize("value, message", [
+    ("", "at least one id"),
+    (" , ,", "at least one id"),
+    ("1,0", "Invalid id: '0'"),
+    ("1,-2", "Invalid id: '-2'"),
+    ("1,x", "Invalid id: 'x'"),
+    ("1,2,3", "At most 2 ids"),
+])
+def test_parse_ids_rejects(value, message):
+    with pytest.raises(ValueError, match=message):
+        parse_ids(value, 2)
+
+
+def test_parse_ids_limit_counts_distinct_ids():
+    assert parse_ids("1,1,1,2,2", 2) == [1, 2]
+
+
+def test_parse_ids_stops_at_the_limit():
+    value = ",".join(str(i) for i in range(1, 100_001))
+    started = time.perf_counter()
+    with pytest.raises(ValueError, match="At most 100 ids"):
+        parse_ids(value, 100)
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,53 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify, request
+
+import compression
+from compression import compress_response
+from config import settings
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/big")
+    def big():
+        response = jsonify(data=["x" * 10] * settings.COMPRESS_MIN_SIZE)
+        response.set_etag("v1")
+        return response.make_conditional(request)
+
+    @app.route("/small")
+    def small():
+        return jsonify(data=[])
+
+    app.after_request(lambda response: compress_response(response, request))
+    return app.test_client()
+
+
+def test_gzip_when_asked(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).startswith(b'{"data":["xxxxxxxxxx"')
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_brotli_wins_ties(client):
+    if compression.brotli is None:
+        pytest.skip("brotli is not installed")
+    response = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert compression.brotli.decompress(response.data).startswith(b'{"data"')
+
+
+def test_small_or_unasked_bodies_are_sent_as_they_are(client):
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/big").headers
+
+
+def test_compressed_response_still_revalidates(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert client.get("/big", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]}).status_code == 304
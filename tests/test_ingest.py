@@ -0,0 +1,177 @@
+import os
+import time
+
+import pytest
+from mysql.connector import errors
+
+import ingest
+from config import settings
+from exceptions import HTTPException
+from models.user import UserModel
+from schemas.user import UserCreate
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return ingest.IngestQueue(os.path.join(str(tmp_path), "ingest", "queue.sqlite3"))
+
+
+@pytest.fixture
+def quick_retries(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_RETRY_AFTER", 0.0)
+    monkeypatch.setattr(settings, "INGEST_CLAIM_TIMEOUT", 300.0)
+    monkeypatch.setattr(settings, "INGEST_MAX_ATTEMPTS", 3)
+
+
+def submit(queue, name, result_id=1):
+    return queue.append(UserCreate(name=name, result_id=result_id).model_dump_json())
+
+
+def fake_bulk(monkeypatch, reject=(), unavailable=lambda: False):
+    """Stand-in for create_users_bulk that fails like the model does: a
+    driver error re-raised as a 500"""
+    calls = []
+
+    async def create_users_bulk(items, receipts=False):
+        calls.append([user_data['name'] for _, user_data in items])
+        try:
+            if unavailable():
+                raise errors.OperationalError("Lost connection to MySQL server")
+            bad = [user_data['name'] for _, user_data in items if user_data['name'] in reject]
+            if bad:
+                raise errors.DatabaseError(msg=f"Data too long for column 'name' ({bad[0]})")
+        except errors.Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return [{"index": index, "status": "success", "id": offset + 1}
+                for offset, (index, _) in enumerate(items)]
+
+    monkeypatch.setattr(UserModel, "create_users_bulk", staticmethod(create_users_bulk))
+    return calls
+
+
+def states(queue, tracking_ids):
+    return [queue.status(tracking_id)['state'] for tracking_id in tracking_ids]
+
+
+def test_append_is_pending(queue):
+    tracking_id = submit(queue, "a")
+    status = queue.status(tracking_id)
+    assert status['state'] == ingest.PENDING
+    assert status['user_id'] is None
+    assert queue.pending_count() == 1
+    assert queue.status("unknown") is None
+
+
+def test_claim_takes_oldest_first_and_only_once(queue):
+    first, second, third = submit(queue, "a"), submit(queue, "b"), submit(queue, "c")
+    claimed = queue.claim(2, claim_timeout=300)
+    assert [(tracking_id, attempts) for tracking_id, _, attempts in claimed] == \
+        [(first, 1), (second, 1)]
+    assert [tracking_id for tracking_id, _, _ in queue.claim(10, claim_timeout=300)] == [third]
+    assert queue.claim(10, claim_timeout=300) == []
+
+
+def test_expired_claims_are_taken_again(queue):
+    tracking_id = submit(queue, "a")
+    queue.claim(10, claim_timeout=300)
+    # A worker that died holding the claim: it expires after claim_timeout
+    time.sleep(0.01)
+    claimed = queue.claim(10, claim_timeout=0)
+    assert [(claimed_id, attempts) for claimed_id, _, attempts in claimed] == [(tracking_id, 2)]
+
+
+def test_complete_records_outcomes(queue):
+    done, failed = submit(queue, "a"), submit(queue, "b")
+    queue.claim(10, claim_timeout=300)
+    queue.complete({
+        done: {"status": "success", "id": 42},
+        failed: {"status": "error", "message": "Result with ID 1 does not exist"},
+    })
+    assert queue.status(done)['state'] == ingest.DONE
+    assert queue.status(done)['user_id'] == 42
+    assert queue.status(failed)['state'] == ingest.FAILED
+    assert queue.status(failed)['error'] == "Result with ID 1 does not exist"
+    assert queue.pending_count() == 0
+
+
+def test_retry_later_delays_the_next_claim(queue):
+    tracking_id = submit(queue, "a")
+    queue.claim(10, claim_timeout=300)
+    queue.retry_later([tracking_id], delay=60, claim_timeout=300)
+    assert queue.claim(10, claim_timeout=300) == []
+    queue.retry_later([tracking_id], delay=0, claim_timeout=300)
+    assert [claimed_id for claimed_id, _, _ in queue.claim(10, claim_timeout=300)] == [tracking_id]
+
+
+def test_purge_keeps_pending_entries(queue):
+    done, pending = submit(queue, "a"), submit(queue, "b")
+    queue.claim(1, claim_timeout=300)
+    queue.complete({done: {"status": "success", "id": 1}})
+    time.sleep(0.01)
+    assert queue.purge(older_than=0) == 1
+    assert queue.status(done) is None
+    assert queue.status(pending)['state'] == ingest.PENDING
+
+
+def test_flush_batch_commits_in_one_call(queue, quick_retries, monkeypatch):
+    calls = fake_bulk(monkeypatch)
+    tracking_ids = [submit(queue, name) for name in "abc"]
+    assert ingest.flush_batch(queue, 10) == 3
+    assert calls == [["a", "b", "c"]]
+    assert states(queue, tracking_ids) == [ingest.DONE] * 3
+
+
+def test_rejected_entry_does_not_block_the_rest(queue, quick_retries, monkeypatch):
+    calls = fake_bulk(monkeypatch, reject={"bad"})
+    tracking_ids = [submit(queue, name) for name in ("a", "bad", "c", "d")]
+
+    ingest.flush_batch(queue, 10)
+    # Split until the refused entry is alone; everything else commits
+    assert calls[0] == ["a", "bad", "c", "d"]
+    assert ["bad"] in calls
+    assert states(queue, tracking_ids) == [ingest.DONE, ingest.PENDING, ingest.DONE, ingest.DONE]
+
+    # Retried alone, then failed on its INGEST_MAX_ATTEMPTS-th claim
+    ingest.flush_batch(queue, 10)
+    assert queue.status(tracking_ids[1])['state'] == ingest.PENDING
+    ingest.flush_batch(queue, 10)
+    status = queue.status(tracking_ids[1])
+    assert status['state'] == ingest.FAILED
+    assert "Data too long" in status['error']
+    assert ingest.flush_batch(queue, 10) == 0
+
+
+def test_unreachable_database_keeps_the_batch(queue, quick_retries, monkeypatch):
+    down = [True]
+    calls = fake_bulk(monkeypatch, unavailable=lambda: down[0])
+    tracking_ids = [submit(queue, name) for name in "ab"]
+
+    for _ in range(settings.INGEST_MAX_ATTEMPTS + 1):
+        with pytest.raises(HTTPException):
+            ingest.flush_batch(queue, 10)
+    # No bisecting against a database that is down, and nothing failed
+    assert all(len(call) == 2 for call in calls)
+    assert states(queue, tracking_ids) == [ingest.PENDING] * 2
+
+    down[0] = False
+    ingest.flush_batch(queue, 10)
+    assert states(queue, tracking_ids) == [ingest.DONE] * 2
+
+
+def test_invalid_payload_fails_without_reaching_mysql(queue, quick_retries, monkeypatch):
+    calls = fake_bulk(monkeypatch)
+    tracking_id = queue.append('{"name": null}')
+    assert ingest.flush_batch(queue, 10) == 1
+    assert calls == []
+    assert queue.status(tracking_id)['state'] == ingest.FAILED
+
+
+def test_pool_timeout_counts_as_unavailable():
+    try:
+        try:
+            raise errors.PoolError("Timed out waiting for a database connection")
+        except errors.Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException as e:
+        assert ingest._database_unavailable(e)
+    assert not ingest._database_unavailable(HTTPException(status_code=500, detail="x"))
@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+import json_provider
+from json_provider import FastJSONProvider, dumps_bytes
+
+ROW = {"id": 1, "name": "Budi", "take_date": date(2024, 1, 2),
+       "created_at": datetime(2024, 5, 6, 7, 8, 9), "score": Decimal("3.50")}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def flask_app(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_provider, "orjson", None)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def stdlib_body(obj):
+    """What Flask's own provider puts on the wire"""
+    app = Flask(__name__)
+    with app.app_context():
+        return app.json.response(obj).get_data()
+
+
+def test_response_matches_flask_encoding(flask_app):
+    with flask_app.app_context():
+        body = flask_app.json.response({"data": [ROW]}).get_data()
+    assert json.loads(body) == json.loads(stdlib_body({"data": [ROW]}))
+    assert json.loads(body)["data"][0]["created_at"] == "Mon, 06 May 2024 07:08:09 GMT"
+    assert body.endswith(b"\n")
+
+
+def test_dumps_bytes_is_the_response_body(flask_app):
+    with flask_app.app_context():
+        assert dumps_bytes({"data": [ROW]}) == flask_app.json.response({"data": [ROW]}).get_data()
+
+
+def test_iso_datetimes():
+    assert json.loads(dumps_bytes(ROW, datetime_format="iso"))["created_at"] == "2024-05-06T07:08:09"
+
+
+def test_loads_and_dumps_round_trip(flask_app):
+    with flask_app.app_context():
+        text = flask_app.json.dumps({"a": [1, "x"]})
+        assert isinstance(text, str)
+        assert flask_app.json.loads(text) == {"a": [1, "x"]}
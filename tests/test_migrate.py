@@ -0,0 +1,39 @@
+import pytest
+
+from migrate import load_migrations, split_sql
+
+
+def test_split_sql_drops_comments_and_empty_statements():
+    text = """
+-- leading comment
+CREATE TABLE a (id INT);
+  -- indented comment
+CREATE INDEX idx_a ON a (id);
+
+;
+"""
+    assert split_sql(text) == ["CREATE TABLE a (id INT)", "CREATE INDEX idx_a ON a (id)"]
+
+
+def test_split_sql_keeps_multiline_statements():
+    assert split_sql("INSERT INTO a\nSELECT 1\nFROM b;") == ["INSERT INTO a\nSELECT 1\nFROM b"]
+
+
+def test_repo_migrations_are_ordered_and_unique():
+    migrations = load_migrations()
+    versions = [migration.version for migration in migrations]
+    assert versions == sorted(set(versions))
+    assert all(migration.statements() for migration in migrations)
+
+
+def test_duplicate_versions_are_rejected(tmp_path):
+    (tmp_path / "001_a.sql").write_text("SELECT 1;")
+    (tmp_path / "001_b.sql").write_text("SELECT 2;")
+    with pytest.raises(ValueError, match="Duplicate migration versions: \\[1\\]"):
+        load_migrations(str(tmp_path))
+
+
+def test_unversioned_file_is_rejected(tmp_path):
+    (tmp_path / "schema.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError, match="must start with a version"):
+        load_migrations(str(tmp_path))
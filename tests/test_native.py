@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pymysql
+import pytest
+
+import database
+from database import NativePools, Replica, ReplicaSet
+
+
+class FakePool:
+    """aiomysql pool stand-in; a busy one never hands out a connection"""
+
+    def __init__(self, busy=False):
+        self.size, self.maxsize = (1, 1) if busy else (0, 1)
+        self.freesize = 0
+        self.busy = busy
+
+    async def acquire(self):
+        if self.busy:
+            await asyncio.sleep(3600)
+        return object()
+
+    def release(self, connection):
+        pass
+
+
+class FakeDriver:
+    DictCursor = SSDictCursor = object
+
+
+@pytest.fixture
+def native(monkeypatch):
+    replicas = [Replica(host, 3306, None) for host in ("r1", "r2")]
+    for replica in replicas:
+        replica.healthy = True
+        replica.checked_at = time.monotonic()
+    monkeypatch.setattr(database, "_replicas", ReplicaSet(
+        replicas, max_lag=5, check_interval=3600, retry_after=30))
+    return NativePools(FakeDriver, pymysql, FakePool(),
+                       {"r1:3306": FakePool(busy=True), "r2:3306": FakePool()})
+
+
+def acquire(native):
+    return asyncio.run(asyncio.wait_for(native.acquire("q", True, True), 1))
+
+
+def test_busy_replica_is_skipped_without_waiting(native):
+    for _ in range(2):
+        assert acquire(native)._pool is native.replicas["r2:3306"]
+
+
+def test_all_replicas_busy_falls_back_to_the_primary(native):
+    native.replicas["r2:3306"] = FakePool(busy=True)
+    assert acquire(native)._pool is native.primary
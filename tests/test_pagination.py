@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, keyset_condition, keyset_page
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    for direction in ("next", "prev"):
+        token = encode_cursor(created_at, 42, direction)
+        assert "=" not in token
+        assert decode_cursor(token) == (created_at, 42, direction)
+
+
+def test_direction_defaults_to_next():
+    assert encode_cursor(datetime(2024, 1, 1), 1) == encode_cursor(datetime(2024, 1, 1), 1, "next")
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not base64!",
+    encode_cursor(datetime(2024, 1, 1), 1, "sideways"),
+    "eyJpIjoxfQ",  # {"i":1}: no created_at
+])
+def test_bad_tokens_raise_value_error(token):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(token)
+
+
+def rows(*ids):
+    return [{"id": row_id, "created_at": datetime(2024, 1, row_id)} for row_id in ids]
+
+
+def test_keyset_condition():
+    assert keyset_condition(None, "u.created_at", "u.id") == ("", [], "next")
+    where, params, direction = keyset_condition(
+        encode_cursor(datetime(2024, 1, 3), 3, "prev"), "u.created_at", "u.id")
+    assert where == " AND (u.created_at > %s OR (u.created_at = %s AND u.id > %s))"
+    assert (params, direction) == ([datetime(2024, 1, 3)] * 2 + [3], "prev")
+
+
+def test_first_page_links_only_forward():
+    page, next_cursor, prev_cursor = keyset_page(rows(5, 4, 3), 2, "next", None)
+    assert [row["id"] for row in page] == [5, 4] and prev_cursor is None
+    assert decode_cursor(next_cursor) == (datetime(2024, 1, 4), 4, "next")
+
+
+def test_prev_page_comes_back_newest_first():
+    # The ASC query after the cursor; its extra row means newer pages remain
+    token = encode_cursor(datetime(2024, 1, 3), 3, "prev")
+    page, next_cursor, prev_cursor = keyset_page(rows(4, 5, 6), 2, "prev", token)
+    assert [row["id"] for row in page] == [5, 4]
+    assert decode_cursor(next_cursor)[1:] == (4, "next")
+    assert decode_cursor(prev_cursor)[1:] == (5, "prev")
+
+
+def test_last_page_has_no_next_cursor():
+    token = encode_cursor(datetime(2024, 1, 3), 3)
+    page, next_cursor, prev_cursor = keyset_page(rows(2, 1), 2, "next", token)
+    assert next_cursor is None and decode_cursor(prev_cursor)[1:] == (2, "prev")
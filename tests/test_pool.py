@@ -0,0 +1,106 @@
+import pytest
+
+import database
+from database import ConnectionPool, PoolTimeout, connection
+from executor import run_async
+from models.common import stream_rows
+
+from conftest import FakeDatabase
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A ConnectionPool over a FakeDatabase, serving database.connection()"""
+    db = FakeDatabase()
+    pool = ConnectionPool(size=2, timeout=0.05, max_uses=3, max_idle=60, ping_interval=60)
+    pool._connect = db.connect
+    pool.db = db
+    monkeypatch.setattr(database, "get_db_connection", pool.get_connection)
+    monkeypatch.setattr(database, "get_read_connection", pool.get_connection)
+    return pool
+
+
+def borrow(pool):
+    """A pooled connection and the driver connection behind it"""
+    conn = pool.get_connection()
+    return conn, conn._entry.connection
+
+
+def test_exhausted_pool_times_out(pool):
+    held = [pool.get_connection(), pool.get_connection()]
+    with pytest.raises(PoolTimeout):
+        pool.get_connection()
+    assert pool.stats()["timeouts"] == 1
+    held[0].close()
+    assert pool.get_connection() is not None
+
+
+def test_connection_is_recycled_after_max_uses(pool):
+    for _ in range(pool.max_uses):
+        conn, first = borrow(pool)
+        conn.close()
+    assert first.closed
+    conn, second = borrow(pool)
+    assert second is not first
+    assert pool.stats()["recycled"] == 1
+
+
+def test_dead_connection_is_replaced(pool):
+    conn, first = borrow(pool)
+    conn.close()
+    first.alive = False
+    pool.ping_interval = 0
+    conn, second = borrow(pool)
+    assert second is not first and first.closed
+    assert pool.stats()["failed_health_checks"] == 1
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    conn, raw = borrow(pool)
+    raw.in_transaction = True
+    conn.close()
+    assert raw.rollbacks == 1 and not raw.closed
+    assert pool.stats()["idle"] == 1
+    assert borrow(pool)[1] is raw
+
+
+def export(pool, rows, read):
+    """Stream `rows` through an unbuffered cursor, reading `read` batches"""
+    pool.db.handler = lambda query, params: rows if query.startswith("SELECT") else []
+
+    async def stream():
+        async with connection("export", readonly=True) as db:
+            cursor = db.cursor(buffered=False)
+            await db.set_session("net_write_timeout", 3600)
+            await cursor.execute("SELECT * FROM users")
+            for _ in range(read):
+                await cursor.fetchmany(2)
+
+    run_async(stream())
+    return [query for query, _ in pool.db.queries if query.startswith("SET SESSION")]
+
+
+def test_drained_stream_resets_the_session_and_pools_the_connection(pool):
+    assert export(pool, [{"id": 1}, {"id": 2}, {"id": 3}], read=2) == [
+        "SET SESSION net_write_timeout = %s", "SET SESSION net_write_timeout = DEFAULT"]
+    assert pool.stats()["idle"] == 1
+
+
+def test_undrained_stream_closes_the_connection(pool):
+    assert export(pool, [{"id": 1}, {"id": 2}, {"id": 3}], read=1) == [
+        "SET SESSION net_write_timeout = %s"]
+    stats = pool.stats()
+    assert (stats["open"], stats["idle"]) == (0, 0)
+
+
+def test_export_cut_short_frees_its_pool_slot(pool):
+    pool.db.handler = lambda query, params: [{"id": 1}, {"id": 2}, {"id": 3}]
+
+    async def first_batch():
+        batches = stream_rows("export", "SELECT * FROM users", (), 2)
+        batch = await batches.__anext__()
+        await batches.aclose()
+        return batch
+
+    assert run_async(first_batch()) == [{"id": 1}, {"id": 2}]
+    assert pool.stats()["open"] == 0
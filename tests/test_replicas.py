@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+import database
+from database import ConnectionPool, Replica, ReplicaSet, begin_request, connection
+
+from conftest import FakeDatabase
+
+
+def make_replica(host):
+    pool = ConnectionPool(size=1, timeout=5, max_uses=100, max_idle=60, ping_interval=60)
+    pool._connect = FakeDatabase().connect
+    replica = Replica(host, 3306, pool)
+    replica.healthy = True
+    replica.checked_at = time.monotonic()
+    return replica
+
+
+@pytest.fixture
+def replicas():
+    return ReplicaSet([make_replica("r1"), make_replica("r2")],
+                      max_lag=5, check_interval=3600, retry_after=30)
+
+
+def test_busy_replica_is_skipped_without_waiting(replicas):
+    first = replicas.get_connection()
+    started = time.monotonic()
+    second = replicas.get_connection()
+    assert time.monotonic() - started < 1
+    assert first._pool is not second._pool
+
+
+def test_all_replicas_busy_falls_back_at_once(replicas):
+    borrowed = [replicas.get_connection(), replicas.get_connection()]
+    started = time.monotonic()
+    assert replicas.get_connection() is None
+    assert time.monotonic() - started < 1
+    borrowed[0].close()
+    assert replicas.get_connection() is not None
+
+
+def test_replica_marked_down_is_not_chosen(replicas):
+    replicas.replicas[0].mark_down(30)
+    for _ in range(3):
+        assert replicas.choose() is replicas.replicas[1]
+    replicas.replicas[1].mark_down(30)
+    assert replicas.get_connection() is None
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    """Primary and replica FakeDatabases behind database.connection()"""
+    primary, replica = FakeDatabase(), FakeDatabase()
+    monkeypatch.setattr(database, "get_db_connection", primary.connect)
+    monkeypatch.setattr(database, "get_read_connection", replica.connect)
+    return primary, replica
+
+
+async def run(name, readonly=False, commit=False):
+    async with connection(name, readonly=readonly) as db:
+        await db.cursor().execute(name)
+        if commit:
+            await db.commit()
+
+
+def statements(database):
+    return [query for query, _ in database.queries]
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(routing):
+    async def request():
+        begin_request()
+        await run("read", readonly=True)
+        await run("write", commit=True)
+
+    asyncio.run(request())
+    primary, replica = routing
+    assert (statements(primary), statements(replica)) == (["write"], ["read"])
+
+
+def test_reads_after_a_write_stay_on_the_primary(routing):
+    async def request():
+        begin_request()
+        await run("write", commit=True)
+        await run("read", readonly=True)
+
+    async def next_request():
+        begin_request()
+        await run("next read", readonly=True)
+
+    asyncio.run(request())
+    asyncio.run(next_request())
+    primary, replica = routing
+    assert (statements(primary), statements(replica)) == (["write", "read"], ["next read"])
+
+
+def test_read_falls_back_to_the_primary_without_a_usable_replica(replicas, monkeypatch):
+    for replica in replicas.replicas:
+        replica.mark_down(30)
+    primary = FakeDatabase()
+    monkeypatch.setattr(database, "get_replicas", lambda: replicas)
+    monkeypatch.setattr(database, "get_db_connection", primary.connect)
+    assert database.get_read_connection().database is primary
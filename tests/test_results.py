@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+
+from exceptions import HTTPException
+from executor import run_async
+from models.result import ResultModel
+from app import app
+
+NOW = datetime(2024, 5, 6, 7, 8, 9)
+
+
+@pytest.fixture
+def results(fake_db):
+    """A results table of one live row, answering the ResultModel queries"""
+    rows = {1: {"id": 1, "title": "T", "description": None, "created_at": NOW,
+                "updated_at": NOW, "deleted_at": None}}
+
+    def visible(row, query):
+        return row["deleted_at"] is None or "deleted_at IS NULL" not in query
+
+    def handler(query, params):
+        if query.startswith("SELECT id, title") and "ORDER BY created_at" in query:
+            return [{k: v for k, v in row.items() if k != "deleted_at"}
+                    for row in reversed(rows.values()) if visible(row, query)]
+        if query.startswith("SELECT id, title"):
+            return [{k: v for k, v in row.items() if k != "deleted_at"}
+                    for row in rows.values() if row["id"] in params and visible(row, query)]
+        if query.startswith("UPDATE results SET deleted_at"):
+            row = rows.get(params[1])
+            if row is None or row["deleted_at"] is not None:
+                return 0
+            row["deleted_at"] = params[0]
+            return 1
+        # The users cascade finds nothing to delete
+        return []
+
+    fake_db.handler = handler
+    ResultModel.invalidate_cache()
+    return rows
+
+
+def test_get_result(results):
+    assert run_async(ResultModel.get_result_by_id(1))["title"] == "T"
+
+
+def test_get_result_is_404_after_delete(results):
+    assert run_async(ResultModel.get_result_by_id(1))
+    run_async(ResultModel.delete_result(1))
+    with pytest.raises(HTTPException) as raised:
+        run_async(ResultModel.get_result_by_id(1))
+    assert raised.value.status_code == 404
+
+
+def test_delete_twice_is_404(results):
+    run_async(ResultModel.delete_result(1))
+    with pytest.raises(HTTPException) as raised:
+        run_async(ResultModel.delete_result(1))
+    assert raised.value.status_code == 404
+
+
+def test_ids_lookup_skips_deleted_results(results):
+    results[2] = dict(results[1], id=2, deleted_at=NOW)
+    assert list(run_async(ResultModel.get_results_by_ids([1, 2]))) == [1]
+
+
+def write(results, result_id, **changes):
+    """A write made elsewhere, once this worker's cache has let go of it"""
+    results[result_id].update(changes)
+    ResultModel.invalidate_cache()
+
+
+def test_unchanged_result_is_304(results):
+    client = app.test_client()
+    response = client.get("/results/1")
+    assert response.status_code == 200 and response.last_modified
+    assert client.get("/results/1", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    write(results, 1, title="U", updated_at=NOW.replace(hour=8))
+    assert client.get("/results/1", headers={"If-None-Match": response.headers["ETag"]}).status_code == 200
+
+
+def test_listing_validator_changes_when_a_row_leaves_it(results):
+    results[2] = dict(results[1], id=2)
+    client = app.test_client()
+    response = client.get("/results/")
+    assert response.status_code == 200 and [row["id"] for row in response.json["data"]] == [2, 1]
+    # No Last-Modified: a delete does not raise max(updated_at)
+    assert "Last-Modified" not in response.headers
+    etag = response.headers["ETag"]
+    assert client.get("/results/", headers={"If-None-Match": etag}).status_code == 304
+
+    write(results, 2, deleted_at=NOW)
+    response = client.get("/results/", headers={
+        "If-None-Match": etag, "If-Modified-Since": "Mon, 06 May 2024 07:08:09 GMT"})
+    assert response.status_code == 200 and [row["id"] for row in response.json["data"]] == [1]
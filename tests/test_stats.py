@@ -0,0 +1,58 @@
+import re
+from datetime import date, datetime
+
+from models.stats import DIMENSIONS, StatsModel
+
+
+def user(result_id=1, prodi="TI", take_date=date(2024, 1, 1)):
+    return {"result_id": result_id, "prodi": prodi, "take_date": take_date}
+
+
+def test_new_row_counts_in_every_dimension():
+    assert StatsModel.row_deltas(None, user()) == {
+        ("result", "1"): 1, ("prodi", "TI"): 1, ("take_date", "2024-01-01"): 1}
+
+
+def test_removed_row_counts_out():
+    assert StatsModel.row_deltas(user(), None) == {
+        ("result", "1"): -1, ("prodi", "TI"): -1, ("take_date", "2024-01-01"): -1}
+
+
+def test_unchanged_dimensions_cancel_out():
+    assert StatsModel.row_deltas(user(), user(result_id=2)) == {
+        ("result", "1"): -1, ("result", "2"): 1}
+    assert StatsModel.row_deltas(user(), user()) == {}
+
+
+def test_keys_match_the_sql_side():
+    # '' for NULL, ISO dates (datetime values included) as CAST(... AS CHAR) gives
+    deltas = StatsModel.row_deltas(
+        None, user(result_id=None, prodi=None, take_date=datetime(2024, 2, 3, 4, 5)))
+    assert deltas == {("result", ""): 1, ("prodi", ""): 1, ("take_date", "2024-02-03"): 1}
+
+
+def test_rows_delta_query_params_repeat_per_dimension():
+    query = StatsModel.rows_delta_query("id BETWEEN %s AND %s", -1)
+    assert query.count("%s") == 2 * len(DIMENSIONS)
+    assert StatsModel.rows_delta_params([5, 9]) == [5, 9] * len(DIMENSIONS)
+    assert "-1 * COUNT(*)" in query
+
+
+def test_rows_delta_query_update_is_unambiguous():
+    # MySQL rejects an unqualified column that exists both in user_stats
+    # and in the derived table (ERROR 1052)
+    query = StatsModel.rows_delta_query("id = %s", 1)
+    update = query.split("ON DUPLICATE KEY UPDATE", 1)[1]
+    derived = re.findall(r"AS (\w+) FROM users", query)
+    assert "user_count" not in derived
+    assert update.split() == ["user_count", "=", "user_stats.user_count", "+", "d.delta"]
+
+
+def test_deltas_are_applied_in_key_order():
+    # 1 -> 2 and 2 -> 1 must lock the two result rows in the same order
+    forward = StatsModel.deltas_query(StatsModel.row_deltas(user(result_id=1), user(result_id=2)))
+    backward = StatsModel.deltas_query(StatsModel.row_deltas(user(result_id=2), user(result_id=1)))
+    assert forward[1] == ["result", "1", -1, "result", "2", 1]
+    assert backward[1] == ["result", "1", 1, "result", "2", -1]
+    assert "VALUES(" not in forward[0]
+    assert "user_count = user_stats.user_count + new.user_count" in " ".join(forward[0].split())
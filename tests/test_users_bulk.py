@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+from executor import run_async
+from models.user import UserModel
+
+
+@pytest.fixture
+def users_table(fake_db):
+    """Bulk-insert side of the users table; ids are handed out with gaps,
+    as concurrent statements do under innodb_autoinc_lock_mode=2"""
+    state = {"ids": {}, "receipts": {}, "stats": []}
+    next_id = itertools.count(10, 3)
+
+    def handler(query, params):
+        if query.startswith("SELECT id FROM results"):
+            return [{"id": result_id} for result_id in params if result_id != 404]
+        if query.startswith("SELECT tracking_id, user_id FROM ingest_receipts"):
+            return [{"tracking_id": key, "user_id": state["receipts"][key]}
+                    for key in params if key in state["receipts"]]
+        if query.startswith("INSERT INTO users"):
+            state["ids"][params[-1]] = next(next_id)
+            return 1
+        if query.startswith("SELECT id, insert_key FROM users"):
+            return [{"id": state["ids"][key], "insert_key": key}
+                    for key in params if key in state["ids"]]
+        if query.startswith("INSERT INTO user_stats"):
+            state["stats"].append((query, params))
+            return 1
+        if query.startswith("INSERT INTO ingest_receipts"):
+            state["receipts"][params[0]] = params[1]
+            return 1
+        return []
+
+    fake_db.handler = handler
+    return state
+
+
+def user(name, result_id=1):
+    return {"name": name, "result_id": result_id}
+
+
+def test_ids_are_read_back_not_derived(users_table):
+    outcomes = run_async(UserModel.create_users_bulk(
+        [(0, user("a")), (1, user("b", result_id=404)), (2, user("c"))]))
+    assert outcomes == [
+        {"index": 0, "status": "success", "id": 10},
+        {"index": 1, "status": "error", "message": "Result with ID 404 does not exist"},
+        {"index": 2, "status": "success", "id": 13},
+    ]
+    # Stats count exactly the inserted rows, by key
+    (query, params), = users_table["stats"]
+    assert "insert_key IN (%s, %s)" in query
+    assert sorted(params) == sorted(list(users_table["ids"]) * 3)
+
+
+def test_receipts_record_the_real_ids(users_table):
+    tracking_ids = ["a" * 32, "b" * 32]
+    outcomes = run_async(UserModel.create_users_bulk(
+        [(tracking_id, user(tracking_id[0])) for tracking_id in tracking_ids], receipts=True))
+    assert [outcome["id"] for outcome in outcomes] == [10, 13]
+    assert users_table["receipts"] == {"a" * 32: 10, "b" * 32: 13}
+
+    # Retried after a crash: answered from the receipts, nothing inserted
+    outcomes = run_async(UserModel.create_users_bulk(
+        [(tracking_id, user(tracking_id[0])) for tracking_id in tracking_ids], receipts=True))
+    assert [outcome["id"] for outcome in outcomes] == [10, 13]
+    assert len(users_table["ids"]) == 2
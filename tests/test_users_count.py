@@ -0,0 +1,63 @@
+import pytest
+
+import models.user
+from config import settings
+from executor import run_async
+from models.user import UserModel
+
+
+@pytest.fixture
+def users(fake_db, monkeypatch):
+    """Three users; each COUNT and EXPLAIN is recorded"""
+    state = {"total": 3, "counts": 0}
+
+    def handler(query, params):
+        if query.startswith("SELECT COUNT(*)"):
+            state["counts"] += 1
+            return [{"total": state["total"]}]
+        if query.startswith("EXPLAIN"):
+            state["counts"] += 1
+            return [{"table": "r", "rows": 1, "filtered": 100.0},
+                    {"table": "u", "rows": 80, "filtered": 25.0}]
+        return [{"id": user_id} for user_id in range(1, state["total"] + 1)]
+
+    fake_db.handler = handler
+    monkeypatch.setattr(models.user, "_last_count_write", 0.0)
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_LAG", 5.0)
+    models.user._count_cache.invalidate()
+    return state
+
+
+def total(count_mode="exact", search=None):
+    return run_async(UserModel.get_users(1, 10, False, search, count_mode=count_mode))[1]
+
+
+def test_exact_total_is_cached_per_filter_set(users):
+    assert total() == 3 and total() == 3
+    assert users["counts"] == 1
+    total(search="a")
+    assert users["counts"] == 2
+
+
+def test_total_is_not_cached_within_the_lag_window_after_a_write(users, monkeypatch):
+    total()
+    UserModel.invalidate_counts()
+    users["total"] = 4
+    assert total() == 4 and total() == 4
+    assert users["counts"] == 3
+
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_LAG", 0.0)
+    total()
+    assert total() == 4
+    assert users["counts"] == 4
+
+
+def test_approximate_total_scales_the_users_estimate(users):
+    assert total("approximate") == 20
+
+
+def test_no_total_skips_the_count(users):
+    users_page, total_records, has_next = run_async(
+        UserModel.get_users(1, 2, False, count_mode="none"))
+    assert (len(users_page), total_records, has_next) == (2, None, True)
+    assert users["counts"] == 0
@@ -0,0 +1,67 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from executor import run_async
+from models.user import UserModel
+from services import user as service
+from services.common import QueryArgs
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+
+    async def get_users_by_ids(ids, fields=None, include_deleted=False):
+        calls.append(include_deleted)
+        return {}
+
+    monkeypatch.setattr(UserModel, "get_users_by_ids", staticmethod(get_users_by_ids))
+    return calls
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, False), ("false", False), ("0", False), ("no", False),
+    ("true", True), ("1", True),
+])
+def test_ids_lookup_parses_include_deleted(lookups, value, expected):
+    args = {"ids": "1,2"}
+    if value is not None:
+        args["include_deleted"] = value
+    run_async(service.list_users(QueryArgs(MultiDict(args)), lambda *a: ""))
+    assert lookups == [expected]
+
+
+@pytest.mark.parametrize("value, expected", [("false", False), ("0", False), ("1", True)])
+def test_export_parses_include_deleted(monkeypatch, value, expected):
+    calls = []
+
+    def stream_users(include_deleted, *args):
+        calls.append(include_deleted)
+
+    monkeypatch.setattr(UserModel, "stream_users", staticmethod(stream_users))
+    service.export_users(QueryArgs(MultiDict({"include_deleted": value})))
+    assert calls == [expected]
+
+
+def test_parse_fields():
+    assert service.parse_fields(None) is None
+    assert service.parse_fields(" id, name ,") == ["id", "name"]
+    with pytest.raises(ValueError, match="Unknown fields: password"):
+        service.parse_fields("id,password")
+    with pytest.raises(ValueError, match="at least one field"):
+        service.parse_fields(" , ")
+
+
+def test_select_fields_reads_only_what_the_response_needs():
+    assert service.select_fields(None) is None
+    assert service.select_fields(["name"]) == {"id", "name"}
+    assert service.select_fields(["image_url"]) == {"id", "image_hash"}
+    query = UserModel.page_query(1, 10, False, fields=service.select_fields(["name"]))[0]
+    assert query.split("FROM users u")[0].split() == ["SELECT", "u.id,", "u.name"]
+
+
+def test_shape_users_cuts_rows_to_the_requested_fields():
+    rows = [{"id": 7, "name": "Budi", "image_hash": "ab" * 32}]
+    image_url = lambda user_id, version: f"/users/{user_id}/image?v={version}"
+    assert service.shape_users(rows, ["image_url", "name"], image_url) == [
+        {"image_url": "/users/7/image?v=" + "ab" * 8, "name": "Budi"}]
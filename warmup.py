@@ -0,0 +1,47 @@
+import logging
+import time
+from datetime import datetime
+
+from config import settings
+from database import get_pool, get_replicas, Error
+from executor import run_async, run_blocking
+import ingest
+from schemas.result import ResultResponse
+from schemas.user import UserRow
+from schemas.validation import prepare_adapters
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app):
+    """Pay one-off first-request costs while the worker boots.
+
+    Opens pooled connections, starts the event loop and an executor
+    thread, builds the response adapters and the URL matcher, and runs
+    the JSON encoder once. A database that is down is logged, not raised,
+    so the worker still starts.
+    """
+    started = time.perf_counter()
+
+    pools = [get_pool()]
+    if get_replicas() is not None:
+        pools += [replica.pool for replica in get_replicas().replicas]
+    for pool in pools:
+        try:
+            pool.prefill(settings.WARMUP_DB_CONNECTIONS)
+        except Error as e:
+            logger.warning("warm-up: could not open database connections: %s", e)
+
+    # Thread-local loop for this thread plus one executor thread
+    run_async(run_blocking(time.monotonic))
+
+    prepare_adapters(ResultResponse, UserRow)
+
+    # Queued submissions left by an earlier worker get flushed now
+    ingest.resume()
+
+    # Werkzeug compiles its URL matcher on the first match
+    app.url_map.bind('localhost').match('/')
+    app.json.dumps({"id": 1, "created_at": datetime.now(), "title": None})
+
+    logger.info("warm-up finished in %.1f ms", (time.perf_counter() - started) * 1000)